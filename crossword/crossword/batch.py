@@ -0,0 +1,163 @@
+"""
+Batch puzzle production.
+
+Reads a jobs file with one `structure words` pair per line, finds up to
+`solutions` distinct solutions of every job on a pool of solver
+processes, and writes one JSON line per solution to stdout as results
+arrive. If an output directory is given, each solution is also rendered
+to a PNG there by a separate pool of render processes, so solving never
+waits on rendering.
+"""
+
+import json
+import os
+import sys
+from itertools import islice
+from multiprocessing import Pool
+
+from crossword import *
+from generate import CrosswordCreator
+from render import Renderer
+
+# Crosswords loaded by a render worker, keyed by (structure, words), and
+# the renderer it draws every image with
+_crosswords = dict()
+_renderer = None
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [2, 3, 4, 5, 6]:
+        sys.exit("Usage: python batch.py jobs [solutions] [output] "
+                 "[processes] [render_processes]")
+
+    # Parse command-line arguments
+    jobs = read_jobs(sys.argv[1])
+    solutions = int(sys.argv[2]) if len(sys.argv) >= 3 else 1
+    output = sys.argv[3] if len(sys.argv) >= 4 else None
+    processes = int(sys.argv[4]) if len(sys.argv) >= 5 else None
+    render_processes = int(sys.argv[5]) if len(sys.argv) == 6 else 1
+
+    for result in run_batch(jobs, solutions, output, processes,
+                            render_processes):
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+
+def read_jobs(filename):
+    """
+    Return the list of `(structure, words)` pairs in the jobs file
+    `filename`, skipping blank lines and lines starting with #.
+    """
+    jobs = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError(f"Bad job line: {line}")
+            jobs.append(tuple(fields))
+    return jobs
+
+
+def run_batch(jobs, solutions=1, output=None, processes=None,
+              render_processes=1):
+    """
+    Solve every `(structure, words)` pair in `jobs` and yield a dictionary
+    for each solution as jobs finish, with the job number, its files, the
+    solution number, the filled grid as a list of strings, and the `image`
+    it is rendered to (None without an `output` directory). A job with no
+    solution yields a single result whose `grid` is None.
+
+    Images are rendered in the background, and all of them have been
+    written once the generator is exhausted.
+    """
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+        renderer = Pool(render_processes, initializer=_init_renderer)
+    else:
+        renderer = None
+    pending = []
+
+    try:
+        with Pool(processes) as pool:
+            work = (
+                (k, structure, words, solutions)
+                for k, (structure, words) in enumerate(jobs)
+            )
+            for k, grids in pool.imap_unordered(_solve, work):
+                structure, words = jobs[k]
+                result = {
+                    "job": k,
+                    "structure": structure,
+                    "words": words
+                }
+                if not grids:
+                    yield dict(result, solution=None, grid=None, image=None)
+                    continue
+                for n, grid in enumerate(grids):
+                    image = None
+                    if renderer is not None:
+                        image = os.path.join(output, f"{k}-{n}.png")
+                        pending.append(renderer.apply_async(
+                            _render, (structure, words, grid, image)
+                        ))
+                    yield dict(result, solution=n, grid=grid, image=image)
+
+        # Wait for the renders, surfacing any error they raised
+        for render in pending:
+            render.get()
+    finally:
+        if renderer is not None:
+            renderer.close()
+            renderer.join()
+
+
+def _solve(job):
+    k, structure, words, solutions = job
+    creator = CrosswordCreator(Crossword(structure, words))
+    return k, [
+        grid_rows(creator, assignment)
+        for assignment in islice(creator.solutions(), solutions)
+    ]
+
+
+def grid_rows(creator, assignment):
+    """
+    Return the letters of `assignment` as a list of strings, one per row,
+    with # for blocked cells.
+    """
+    letters = creator.letter_grid(assignment)
+    return [
+        "".join(
+            (letters[i][j] or " ") if creator.crossword.structure[i][j]
+            else "#"
+            for j in range(creator.crossword.width)
+        )
+        for i in range(creator.crossword.height)
+    ]
+
+
+def _init_renderer():
+    global _renderer
+    _renderer = Renderer()
+
+
+def _render(structure, words, grid, filename):
+    if (structure, words) not in _crosswords:
+        _crosswords[structure, words] = Crossword(structure, words)
+    crossword = _crosswords[structure, words]
+
+    # Read each variable's word back off the grid
+    assignment = {
+        var: "".join(grid[i][j] for i, j in var.cells)
+        for var in crossword.variable_list
+    }
+    CrosswordCreator(crossword).save(assignment, filename, _renderer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Solver benchmark for crossword.
+
+Solves every `data/structure*.txt` with every `data/words*.txt`, plus
+larger grids generated from the word lists, and reports time and solver
+counters for each. Every run is appended to a JSON lines history file, and times
+are compared against the previous run in the history.
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from crossword import *
+from generate import BudgetExhausted, CrosswordCreator
+
+# Generated grids as (word list, size, seed)
+GENERATED = [
+    ("words1.txt", 9, 0),
+    ("words2.txt", 9, 0),
+    ("words2.txt", 13, 0),
+    ("words2.txt", 17, 0),
+    ("words2.txt", 25, 0)
+]
+
+# Failed values allowed per solve, so that hard cases still finish
+BUDGET = 2000
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [1, 2, 3]:
+        sys.exit("Usage: python benchmark.py [data_directory] [history]")
+    directory = sys.argv[1] if len(sys.argv) >= 2 else "data"
+    history = (sys.argv[2] if len(sys.argv) == 3 else
+               os.path.join(cache_directories()[0], "benchmark.jsonl"))
+
+    previous = last_run(history)
+    with tempfile.TemporaryDirectory() as generated:
+        results = benchmark(cases(directory, generated))
+
+    print(f"{'structure':<28}{'words':<12}{'result':<8}{'seconds':>9}"
+          f"{'before':>9}{'assigned':>10}{'revised':>10}")
+    for result in results:
+        before = previous.get((result["structure"], result["words"]))
+        before = f"{before:9.4f}" if before is not None else f"{'-':>9}"
+        print(f"{result['structure']:<28}{result['words']:<12}"
+              f"{result['result']:<8}{result['seconds']:>9.4f}{before}"
+              f"{result['stats']['assignments']:>10}"
+              f"{result['stats']['revisions']:>10}")
+
+    record(history, results)
+    print(f"Results appended to {history}")
+
+
+def cases(directory, generated):
+    """
+    Return the `(structure, words)` pairs to benchmark: every structure
+    in `directory` with every word list there, and then every grid in
+    `GENERATED` whose word list is in `directory`, written into directory
+    `generated`, with the word list it was generated from.
+    """
+    structures = sorted(glob.glob(os.path.join(directory, "structure*.txt")))
+    words = sorted(glob.glob(os.path.join(directory, "words*.txt")))
+    pairs = [(s, w) for s in structures for w in words]
+    for name, size, seed in GENERATED:
+        source = os.path.join(directory, name)
+        if source not in words:
+            continue
+        with open(source) as f:
+            vocabulary = f.read().upper().splitlines()
+        filename = os.path.join(
+            generated, f"generated-{size}-{seed}-{name}"
+        )
+        with open(filename, "w") as f:
+            f.write(generate_structure(vocabulary, size, seed))
+        pairs.append((filename, source))
+    return pairs
+
+
+def generate_structure(words, size, seed=None, attempts=2000):
+    """
+    Return a random `size` x `size` structure, in the format of the
+    structure files, that can be filled from `words`.
+
+    Words are laid into the grid one at a time, each crossing some word
+    already there, and never alongside or end to end with another word,
+    so every slot of the structure is one word laid down and those words
+    are a solution. Up to `attempts` words are tried.
+    """
+    rng = random.Random(seed)
+    words = sorted(set(w for w in words if 1 < len(w) <= size))
+
+    # Letter in each filled cell, and the directions of words through it
+    letters = dict()
+    directions = dict()
+
+    def crossings(word, i, j, di, dj):
+        """
+        Return the number of words `word` would cross if laid from (i, j)
+        in direction (di, dj), or None if it cannot go there.
+        """
+        end = (i + di * (len(word) - 1), j + dj * (len(word) - 1))
+        if min(i, j) < 0 or max(end) >= size:
+            return None
+        if (i - di, j - dj) in letters or (end[0] + di, end[1] + dj) in letters:
+            return None
+        count = 0
+        for k, letter in enumerate(word):
+            cell = (i + di * k, j + dj * k)
+            if cell in letters:
+                if letters[cell] != letter or (di, dj) in directions[cell]:
+                    return None
+                count += 1
+            elif (cell[0] - dj, cell[1] - di) in letters \
+                    or (cell[0] + dj, cell[1] + di) in letters:
+                return None
+        return count
+
+    def lay(word, i, j, di, dj):
+        for k, letter in enumerate(word):
+            cell = (i + di * k, j + dj * k)
+            letters[cell] = letter
+            directions.setdefault(cell, set()).add((di, dj))
+        words.remove(word)
+
+    # Start with a word across the middle, then cross what is there
+    first = rng.choice(words)
+    lay(first, size // 2, (size - len(first)) // 2, 0, 1)
+    for _ in range(attempts):
+        if not words:
+            break
+        word = rng.choice(words)
+        places = [
+            (i - di * k, j - dj * k, di, dj)
+            for (i, j), through in sorted(directions.items())
+            if len(through) == 1
+            for di, dj in [(1, 0), (0, 1)]
+            if (di, dj) not in through
+            for k, letter in enumerate(word)
+            if letter == letters[i, j]
+        ]
+        places = [
+            place for place in places if crossings(word, *place)
+        ]
+        if places:
+            lay(word, *rng.choice(places))
+
+    return "".join(
+        "".join("_" if (i, j) in letters else "#" for j in range(size))
+        + "\n"
+        for i in range(size)
+    )
+
+
+def benchmark(pairs):
+    """
+    Solve every `(structure, words)` pair in `pairs`, and return a list of
+    results with the case, the `result` ("solved", "none" or "budget"),
+    the total time including loading, and the solver statistics.
+    """
+    results = []
+    for structure, words in pairs:
+        start = time.perf_counter()
+        creator = CrosswordCreator(Crossword(structure, words))
+        try:
+            assignment = creator.solve(budget=BUDGET)
+            result = "none" if assignment is None else "solved"
+        except BudgetExhausted:
+            result = "budget"
+        results.append({
+            "structure": os.path.basename(structure),
+            "words": os.path.basename(words),
+            "result": result,
+            "seconds": time.perf_counter() - start,
+            "stats": creator.stats.as_dict()
+        })
+    return results
+
+
+def last_run(history):
+    """
+    Return the times of the most recent run in the `history` file as a
+    dictionary keyed by (structure, words), or an empty dictionary.
+    """
+    if not os.path.exists(history):
+        return dict()
+    with open(history) as f:
+        lines = f.read().splitlines()
+    if not lines:
+        return dict()
+    run = json.loads(lines[-1])
+    return {
+        (result["structure"], result["words"]): result["seconds"]
+        for result in run["results"]
+    }
+
+
+def record(history, results):
+    """
+    Append a run of `results` to the `history` file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(history)), exist_ok=True)
+    with open(history, "a") as f:
+        f.write(json.dumps({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results
+        }))
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
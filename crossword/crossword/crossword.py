@@ -1,3 +1,13 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+
+# Tag that starts every index file (changing it invalidates old indexes)
+INDEX_FORMAT = b"CWINDEX2"
+
+
 class Variable():
 
     ACROSS = "across"
@@ -15,9 +25,13 @@ class Variable():
                 (self.i + (k if self.direction == Variable.DOWN else 0),
                  self.j + (k if self.direction == Variable.ACROSS else 0))
             )
+        self.hash = hash((self.i, self.j, self.direction, self.length))
+
+        # Position of the variable in its crossword's `variable_list`
+        self.id = None
 
     def __hash__(self):
-        return hash((self.i, self.j, self.direction, self.length))
+        return self.hash
 
     def __eq__(self, other):
         return (
@@ -58,8 +72,7 @@ class Crossword():
                 self.structure.append(row)
 
         # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        self.index = WordIndex.load(words_file)
 
         # Determine variable set
         self.variables = set()
@@ -104,30 +117,306 @@ class Crossword():
                             length=length
                         ))
 
+        # Number variables in reading order, so solvers can index them
+        self.variable_list = tuple(sorted(
+            self.variables, key=lambda v: (v.i, v.j, v.direction)
+        ))
+        for k, var in enumerate(self.variable_list):
+            var.id = k
+
         # Compute overlaps for each word
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored, found from the variables
+        # occupying each cell.
+        occupants = dict()
+        for var in self.variable_list:
+            for k, cell in enumerate(var.cells):
+                occupants.setdefault(cell, []).append((var, k))
+        self.overlaps = Overlaps()
+        for cell_vars in occupants.values():
+            for v1, k1 in cell_vars:
+                for v2, k2 in cell_vars:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
 
-    def neighbors(self, var):
-        """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
+        # adjacency[id] lists (neighbor id, i, j) for each overlap, where
+        # the variable's ith character overlaps the neighbor's jth
+        adjacency = [[] for _ in self.variable_list]
+        for (v1, v2), (k1, k2) in self.overlaps.items():
+            adjacency[v1.id].append((v2.id, k1, k2))
+        self.adjacency = tuple(tuple(sorted(arcs)) for arcs in adjacency)
+        self.neighbor_list = tuple(
+            tuple(self.variable_list[n] for n, _, _ in arcs)
+            for arcs in self.adjacency
         )
+
+    @property
+    def words(self):
+        """The vocabulary, as a `WordIndex` supporting `in` and `len`."""
+        return self.index
+
+    def neighbors(self, var):
+        """Given a variable, return tuple of overlapping variables."""
+        return self.neighbor_list[var.id]
+
+
+class Overlaps(dict):
+
+    def __missing__(self, key):
+        """Pairs of variables that do not overlap have no overlap."""
+        return None
+
+
+class WordIndex():
+
+    def __init__(self, words):
+        """
+        Index `words` for bitset domains.
+
+        Each word gets an integer ID, and a set of words is represented
+        as an int whose bit k is set if word k is in the set. Words are
+        numbered by length and then alphabetically, so the words of each
+        length form one contiguous bucket of IDs. The index holds the set
+        of all words of each length, and the set of all words of each
+        length with a given letter at a given position.
+        """
+        self.path = None
+        self.words = sorted(words, key=lambda word: (len(word), word))
+
+        # buckets[n] is the (first ID, count) of the words of length n
+        self.buckets = dict()
+        by_letter = dict()
+        for k, word in enumerate(self.words):
+            start, count = self.buckets.get(len(word), (k, 0))
+            self.buckets[len(word)] = (start, count + 1)
+            for position, letter in enumerate(word):
+                key = (len(word), position, letter)
+                by_letter.setdefault(key, []).append(k)
+
+        # lengths[n] is the set of words of length n
+        self.lengths = {
+            length: ((1 << count) - 1) << start
+            for length, (start, count) in self.buckets.items()
+        }
+
+        # letters[n, i, c] is the set of words of length n with c at i
+        self.letters = {
+            key: self.mask(ids) for key, ids in by_letter.items()
+        }
+
+        # alphabet[n, i] lists the letters seen at i in words of length n
+        self.alphabet = dict()
+        for length, position, letter in self.letters:
+            self.alphabet.setdefault((length, position), []).append(letter)
+
+    @classmethod
+    def load(cls, filename, cache=None):
+        """
+        Return the index of the words in file `filename`.
+
+        Indexes are saved in directory `cache` (by default, the first
+        writable one of `cache_directories()`) under a hash of the word
+        file, and memory-mapped from there on later loads, so a word list
+        is only ever indexed once. If no cache can be written, the index
+        is built in memory.
+        """
+        with open(filename, "rb") as f:
+            data = f.read()
+        key = hashlib.sha256(INDEX_FORMAT + data).hexdigest()
+        directories = [cache] if cache is not None else cache_directories()
+        paths = [
+            os.path.join(directory, f"{key}.idx") for directory in directories
+        ]
+        for path in paths:
+            if os.path.exists(path):
+                return cls.open(path)
+
+        index = cls(set(data.decode().upper().splitlines()))
+        for path in paths:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                index.save(path)
+            except OSError:
+                continue
+            return cls.open(path)
+        return index
+
+    @classmethod
+    def open(cls, path):
+        """Return the index saved at `path`, memory-mapped."""
+        index = cls.__new__(cls)
+        index.map(path)
+        return index
+
+    def map(self, path):
+        """
+        Memory-map the index saved at `path`. Letter bitsets are read
+        from the file the first time they are used.
+        """
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(INDEX_FORMAT)] != INDEX_FORMAT:
+            raise ValueError(f"Not a word index: {path}")
+        offset = len(INDEX_FORMAT)
+        size = int.from_bytes(buffer[offset:offset + 8], "little")
+        header = json.loads(buffer[offset + 8:offset + 8 + size])
+        base = offset + 8 + size
+
+        self.path = path
+        offset, size, count = header["words"]
+        words = buffer[base + offset:base + offset + size].decode().split("\n")
+        self.words = words if count else []
+        self.buckets = {
+            int(length): tuple(bucket)
+            for length, bucket in header["buckets"].items()
+        }
+        self.lengths = {
+            length: ((1 << count) - 1) << start
+            for length, (start, count) in self.buckets.items()
+        }
+
+        entries = dict()
+        self.alphabet = dict()
+        for length, position, letter, offset, size in header["letters"]:
+            shift = self.buckets[length][0]
+            entries[length, position, letter] = (base + offset, size, shift)
+            self.alphabet.setdefault((length, position), []).append(letter)
+        self.letters = MaskTable(buffer, entries)
+
+    def save(self, path):
+        """
+        Save the index to `path`.
+
+        The file holds the format tag, the size of a JSON header, the
+        header, the words separated by newlines, and then each letter
+        bitset, stored relative to the start of its length bucket. Offsets
+        in the header count from the end of the header.
+        """
+        words = "\n".join(self.words).encode()
+        masks = []
+        letters = []
+        offset = len(words)
+        for (length, position, letter), mask in self.letters.items():
+            start, count = self.buckets[length]
+            data = (mask >> start).to_bytes(count // 8 + 1, "little")
+            letters.append([length, position, letter, offset, len(data)])
+            masks.append(data)
+            offset += len(data)
+
+        header = {
+            "words": [0, len(words), len(self.words)],
+            "buckets": self.buckets,
+            "letters": letters
+        }
+        data = json.dumps(header).encode()
+
+        # Write to a temporary file first, so that a crash never leaves
+        # a partial index behind
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(INDEX_FORMAT)
+            f.write(len(data).to_bytes(8, "little"))
+            f.write(data)
+            f.write(words)
+            for mask in masks:
+                f.write(mask)
+        os.replace(temporary, path)
+
+    def id(self, word):
+        """Return the ID of `word`, which must be in the index."""
+        start, count = self.buckets[len(word)]
+        k = bisect.bisect_left(self.words, word, start, start + count)
+        if k == start + count or self.words[k] != word:
+            raise KeyError(word)
+        return k
+
+    def __contains__(self, word):
+        try:
+            self.id(word)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def mask(self, ids):
+        """Return the bitset containing the word IDs in `ids`."""
+        bits = bytearray(len(self.words) // 8 + 1)
+        for k in ids:
+            bits[k >> 3] |= 1 << (k & 7)
+        return int.from_bytes(bits, "little")
+
+    def decode(self, mask):
+        """Return the list of words in bitset `mask`, in ID order."""
+        words = []
+        bits = bin(mask)[:1:-1]
+        k = bits.find("1")
+        while k != -1:
+            words.append(self.words[k])
+            k = bits.find("1", k + 1)
+        return words
+
+    def __getstate__(self):
+
+        # Memory maps can't be pickled, so mapped indexes are sent by path
+        if self.path is not None:
+            return {"path": self.path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if state.get("path") is not None:
+            self.map(state["path"])
+        else:
+            self.__dict__.update(state)
+
+
+def cache_directories():
+    """
+    Return the directories to keep indexed word lists in, in order of
+    preference: $CROSSWORD_CACHE if set, the user's cache directory, and
+    as a last resort a directory next to this file.
+    """
+    directories = []
+    if os.environ.get("CROSSWORD_CACHE"):
+        directories.append(os.environ["CROSSWORD_CACHE"])
+    base = (os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    directories.append(os.path.join(base, "crossword"))
+    directories.append(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), ".wordcache"
+    ))
+    return directories
+
+
+class MaskTable(dict):
+    """
+    Letter bitsets of a memory-mapped index, read from the map on first
+    use and kept afterwards.
+    """
+
+    def __init__(self, buffer, entries):
+        super().__init__()
+        self.buffer = buffer
+        self.entries = entries
+
+    def __missing__(self, key):
+        offset, size, shift = self.entries[key]
+        mask = int.from_bytes(
+            self.buffer[offset:offset + size], "little"
+        ) << shift
+        self[key] = mask
+        return mask
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            return default
+        return self[key]
@@ -1,6 +1,65 @@
+import json
+import random
 import sys
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 from crossword import *
+from render import default_renderer
+
+
+class SearchLimit(Exception):
+    """Raised when a search uses up its budget of failures."""
+
+
+class BudgetExhausted(SearchLimit):
+    """Raised by `solve` when the whole solve runs out of failures."""
+
+
+class SolverStats():
+
+    # Counted events
+    COUNTERS = (
+        "revisions",        # calls to revise an arc
+        "arcs_queued",      # arcs pushed onto the AC-3 queue
+        "assignments",      # values tried for a variable
+        "backtracks",       # values that failed and were undone
+        "wipeouts",         # domains emptied by propagation
+        "restarts"          # searches abandoned for a restart
+    )
+
+    # Timed phases, in seconds. Arc consistency covers every AC-3 run,
+    # including the propagation after each assignment, which is also
+    # part of the search time
+    TIMERS = ("node_consistency", "arc_consistency", "search")
+
+    def __init__(self):
+        """Create a new set of statistics with every count at zero."""
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.timers = dict.fromkeys(self.TIMERS, 0.0)
+
+    @contextmanager
+    def timer(self, name):
+        """Add the time spent inside the `with` block to timer `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def as_dict(self):
+        """Return the statistics as a dictionary."""
+        stats = {name: getattr(self, name) for name in self.COUNTERS}
+        stats["seconds"] = dict(self.timers)
+        return stats
+
+    def dump(self, filename):
+        """Write the statistics to `filename` as JSON."""
+        with open(filename, "w") as f:
+            json.dump(self.as_dict(), f, indent=4)
+            f.write("\n")
 
 
 class CrosswordCreator():
@@ -8,12 +67,53 @@ class CrosswordCreator():
     def __init__(self, crossword):
         """
         Create new CSP crossword generate.
+
+        Domains are indexed by variable ID, and each domain is a bitset
+        over the word IDs of `crossword.index`, starting as the bucket of
+        words of the variable's length.
         """
         self.crossword = crossword
-        self.domains = {
-            var: self.crossword.words.copy()
-            for var in self.crossword.variables
-        }
+        self.index = crossword.index
+        self.domains = [
+            self.index.lengths.get(var.length, 0)
+            for var in crossword.variable_list
+        ]
+        self.lengths = [var.length for var in crossword.variable_list]
+
+        # Stack of (variable ID, previous domain, previous culprits) for
+        # every domain change, so that backtracking can undo exactly what
+        # was changed
+        self.trail = []
+
+        # Conflict-directed backjumping: culprits[id] is the set of IDs of
+        # assigned variables whose assignments explain the pruning of the
+        # variable's domain, and nogoods maps sets of (variable ID, word)
+        # pairs that cannot be extended to a solution to the pair they
+        # are indexed under, least recently used first
+        self.backjumping = False
+        self.culprits = [frozenset()] * len(crossword.variable_list)
+        self.nogood_limit = 0
+        self.nogoods = OrderedDict()
+        self.nogood_index = dict()
+
+        # Randomized restarts: ties are broken with `rng` when it is set,
+        # and search gives up after `limit` failed values
+        self.rng = None
+        self.shuffle = False
+        self.limit = None
+        self.failures = 0
+
+        # Search budget over all attempts, see `solve`
+        self.budget = None
+        self.spent = 0
+
+        # Counters and timers for the work done by the solver
+        self.stats = SolverStats()
+
+        # Maps (variable ID, position) to (domain, counts), where counts
+        # maps each letter to how many words of that domain have the
+        # letter at that position
+        self.supports = dict()
 
     def letter_grid(self, assignment):
         """
@@ -44,54 +144,87 @@ class CrosswordCreator():
                     print("█", end="")
             print()
 
-    def save(self, assignment, filename):
+    def save(self, assignment, filename, renderer=None):
         """
-        Save crossword assignment to an image file.
+        Save crossword assignment to an image file, drawn by `renderer`
+        or by the shared default renderer.
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
-        letters = self.letter_grid(assignment)
-
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
-            "black"
+        if renderer is None:
+            renderer = default_renderer()
+        renderer.save(
+            self.crossword, self.letter_grid(assignment), filename
         )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
 
-        for i in range(self.crossword.height):
-            for j in range(self.crossword.width):
+    def solve(self, backjump=False, nogoods=0, seed=None, shuffle=False,
+              restart_base=None, budget=None):
+        """
+        Enforce node and arc consistency, and then solve the CSP.
 
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
-                    if letters[i][j]:
-                        w, h = draw.textsize(letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
-                        )
+        If `backjump` is True, search with conflict-directed backjumping,
+        remembering up to `nogoods` failed partial assignments.
 
-        img.save(filename)
+        If `seed` is given, ties between variables and between values are
+        broken at random, or values are tried in a random order if
+        `shuffle` is True. If `restart_base` is given, the kth attempt at
+        the search restarts from scratch after `restart_base * luby(k)`
+        failed values.
 
-    def solve(self):
+        If `budget` is given, BudgetExhausted is raised once that many
+        values have failed in total.
         """
-        Enforce node and arc consistency, and then solve the CSP.
+        self.backjumping = backjump
+        self.nogood_limit = nogoods
+        self.rng = random.Random(seed) if seed is not None else None
+        self.shuffle = shuffle
+        self.budget = budget
+        self.spent = 0
+        self.enforce_node_consistency()
+        if not self.ac3():
+            return None
+        self.trail.clear()
+
+        attempt = 1
+        with self.stats.timer("search"):
+            while True:
+                self.failures = 0
+                if restart_base is not None:
+                    self.limit = restart_base * luby(attempt)
+                try:
+                    if backjump:
+                        return self.backjump(dict())[0]
+                    return self.backtrack(dict())
+                except BudgetExhausted:
+                    self.undo(0)
+                    raise
+                except SearchLimit:
+                    self.undo(0)
+                    self.stats.restarts += 1
+                    attempt += 1
+
+    def solutions(self):
+        """
+        Enforce node and arc consistency, and then yield every solution
+        of the CSP, one at a time, as it is found.
+
+        Each solution is a new dictionary, and no two are the same. The
+        search is suspended between solutions, so taking only the first
+        few costs no more than finding them. The creator is in the middle
+        of a search until the generator is exhausted or closed, and
+        should not be used for anything else meanwhile.
         """
+        self.backjumping = False
         self.enforce_node_consistency()
-        self.ac3()
-        return self.backtrack(dict())
+        if not self.ac3():
+            return
+        self.trail.clear()
+
+        # Time only the search, not the caller's work between solutions
+        start = time.perf_counter()
+        for assignment in self.search(dict()):
+            self.stats.timers["search"] += time.perf_counter() - start
+            yield dict(assignment)
+            start = time.perf_counter()
+        self.stats.timers["search"] += time.perf_counter() - start
 
     def enforce_node_consistency(self):
         """
@@ -99,16 +232,16 @@ class CrosswordCreator():
         (Remove any values that are inconsistent with a variable's unary
          constraints; in this case, the length of the word.)
         """
-        for var in self.domains.keys():
-            for x in list(self.domains[var]):
-                if len(x)!=var.length:
-                    self.domains[var].remove(x)
+        with self.stats.timer("node_consistency"):
+            for var in self.crossword.variable_list:
+                length = self.index.lengths.get(var.length, 0)
+                self.set_domain(var.id, self.domains[var.id] & length)
 
     def revise(self, x, y):
         """
         Make variable `x` arc consistent with variable `y`.
-        To do so, remove values from `self.domains[x]` for which there is no
-        possible corresponding value for `y` in `self.domains[y]`.
+        To do so, remove values from `self.domains[x.id]` for which there is
+        no possible corresponding value for `y` in `self.domains[y.id]`.
 
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
@@ -116,19 +249,34 @@ class CrosswordCreator():
         overlap = self.crossword.overlaps[x,y]
         if overlap is None:
             return False
-        i = overlap[0]
-        j = overlap[1]
-        revised = False
-        for valx in list(self.domains[x]):
-            flag = 0
-            for valy in list(self.domains[y]):
-                if valx[i]==valy[j]:
-                    flag = 1
-                    break
-            if flag!=1:
-                self.domains[x].remove(valx)
-                revised = True
-        return revised
+        return self.revise_arc(x.id, overlap[0], y.id, overlap[1])
+
+    def revise_arc(self, x, i, y, j):
+        """
+        Make the variable with ID `x` arc consistent with the variable with
+        ID `y`, where x's ith character overlaps y's jth character.
+        Return True if the domain of `x` was revised.
+        """
+        self.stats.revisions += 1
+
+        # Collect every word of x whose letter at i is used at j by y
+        letters = self.index.letters
+        length_x = self.lengths[x]
+        length_y = self.lengths[y]
+        domain_y = self.domains[y]
+        supported = 0
+        for letter in self.index.alphabet.get((length_y, j), ()):
+            if domain_y & letters[length_y, j, letter]:
+                supported |= letters.get((length_x, i, letter), 0)
+
+        domain_x = self.domains[x] & supported
+        if domain_x == self.domains[x]:
+            return False
+        if self.backjumping:
+            self.set_domain(x, domain_x, self.culprits[x] | self.culprits[y])
+        else:
+            self.set_domain(x, domain_x)
+        return True
 
     def ac3(self, arcs=None):
         """
@@ -140,18 +288,65 @@ class CrosswordCreator():
         return False if one or more domains end up empty.
         """
         if arcs is None:
-            arcs = list(self.crossword.overlaps.keys())
-        while len(arcs)!=0:
-            (x,y) = arcs[0]
-            arcs = arcs[1:]
-            if self.revise(x,y):
-                if len(self.domains[x])==0:
-                    return False
-                for z in self.crossword.neighbors(x):
-                    if z is not y:
-                        arcs.append((z,x))
-        return True
+            queue = deque(
+                (x, i, y, j)
+                for x, neighbors in enumerate(self.crossword.adjacency)
+                for y, i, j in neighbors
+            )
+        else:
+            queue = deque()
+            for x, y in arcs:
+                overlap = self.crossword.overlaps[x, y]
+                if overlap is not None:
+                    queue.append((x.id, overlap[0], y.id, overlap[1]))
+        return self.propagate(queue)
+
+    def propagate(self, queue):
+        """
+        Run AC-3 over a deque of arcs `(x, i, y, j)` between variable IDs,
+        where x's ith character overlaps y's jth character.
+        Return False if a domain is wiped out, True otherwise. The ID of
+        the variable wiped out is left in `self.wiped`.
+        """
+        with self.stats.timer("arc_consistency"):
+            adjacency = self.crossword.adjacency
+            stats = self.stats
+            queued = set((x, y) for x, _, y, _ in queue)
+            stats.arcs_queued += len(queue)
+            while queue:
+                (x, i, y, j) = queue.popleft()
+                queued.discard((x, y))
+                if self.revise_arc(x, i, y, j):
+                    if self.domains[x]==0:
+                        self.wiped = x
+                        stats.wipeouts += 1
+                        return False
+                    for z, k, l in adjacency[x]:
+                        if z != y and (z, x) not in queued:
+                            queue.append((z, l, x, k))
+                            queued.add((z, x))
+                            stats.arcs_queued += 1
+            return True
+
+    def set_domain(self, var, domain, culprits=None):
+        """
+        Replace the domain of the variable with ID `var`, recording the old
+        one on the trail. If given, `culprits` replaces the set of
+        assigned variables that explain the new domain.
+        """
+        self.trail.append((var, self.domains[var], self.culprits[var]))
+        self.domains[var] = domain
+        if culprits is not None:
+            self.culprits[var] = culprits
 
+    def undo(self, mark):
+        """
+        Restore every domain changed since the trail had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain, culprits = self.trail.pop()
+            self.domains[var] = domain
+            self.culprits[var] = culprits
 
     def assignment_complete(self, assignment):
         """
@@ -191,7 +386,47 @@ class CrosswordCreator():
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
-        pass
+        values = self.index.decode(self.domains[var.id])
+        if self.rng is not None:
+            self.rng.shuffle(values)
+            if self.shuffle:
+                return values
+
+        overlaps = []
+        for y, i, j in self.crossword.adjacency[var.id]:
+            if self.crossword.variable_list[y] not in assignment:
+                size = self.domains[y].bit_count()
+                overlaps.append((i, size, self.support_counts(y, j)))
+
+        def ruled_out(val):
+            return sum(
+                size - counts.get(val[i], 0)
+                for i, size, counts in overlaps
+            )
+
+        return sorted(values, key=ruled_out)
+
+    def support_counts(self, var, position):
+        """
+        Return a dictionary mapping each letter to the number of words in
+        the domain of the variable with ID `var` with that letter at
+        `position`.
+
+        Counts are cached against the domain they were computed for, and
+        recomputed only once the domain has changed.
+        """
+        domain = self.domains[var]
+        cached = self.supports.get((var, position))
+        if cached is not None and cached[0] is domain:
+            return cached[1]
+        letters = self.index.letters
+        length = self.lengths[var]
+        counts = {
+            letter: (domain & letters[length, position, letter]).bit_count()
+            for letter in self.index.alphabet.get((length, position), ())
+        }
+        self.supports[var, position] = (domain, counts)
+        return counts
 
     def select_unassigned_variable(self, assignment):
         """
@@ -201,18 +436,15 @@ class CrosswordCreator():
         degree. If there is a tie, any of the tied variables are acceptable
         return values.
         """
-        select = None
-        minlen = 999
-        for var in self.domains.keys():
-            if var not in assignment.keys():
-                if len(self.domains[var])<=minlen:
-                    if len(self.domains[var])==minlen:
-                        if len(self.crossword.neighbors(var))<len(self.crossword.neighbors(select)):
-                            select = var
-                    else:
-                        minlen = len(self.domains[var])
-                        select = var
-        return select
+        return min(
+            (var for var in self.crossword.variable_list
+             if var not in assignment),
+            key=lambda var: (
+                self.domains[var.id].bit_count(),
+                -len(self.crossword.adjacency[var.id]),
+                self.rng.random() if self.rng is not None else 0
+            )
+        )
 
     def backtrack(self, assignment):
         """
@@ -221,45 +453,213 @@ class CrosswordCreator():
 
         `assignment` is a mapping from variables (keys) to words (values).
 
+        Arc consistency is maintained after every assignment, starting
+        from the arcs into the assigned variable. Because domains stay
+        arc consistent, a value from the domain always fits its assigned
+        neighbors, and only the all-different constraint is left to check.
+
         If no assignment is possible, return None.
         """
         if self.assignment_complete(assignment):
             return assignment
         var = self.select_unassigned_variable(assignment)
-        domain = list(self.domains[var])
-        for val in list(self.domains[var]):
+        for val in self.order_domain_values(var, assignment):
+            if val in assignment.values():
+                continue
             assignment[var] = val
-            if self.consistent(assignment):
-                self.domains[var] = {val}
-                if not self.ac3():
-                    del assignment[var]
-                    self.domains[var] = set(domain.remove(val))
-                    continue
+            self.stats.assignments += 1
+            mark = len(self.trail)
+            self.set_domain(var.id, 1 << self.index.id(val))
+            arcs = deque(
+                (z, l, var.id, k)
+                for z, k, l in self.crossword.adjacency[var.id]
+            )
+            if self.propagate(arcs):
                 result = self.backtrack(assignment)
                 if result is not None:
                     return result
-                del assignment[var]
-                self.domains[var] = set(domain.remove(val))
+            self.undo(mark)
+            del assignment[var]
+            self.count_failure()
+        return None
+
+    def search(self, assignment):
+        """
+        Like `backtrack`, but yield every complete assignment that extends
+        `assignment` instead of returning the first. The same dictionary
+        is yielded each time, and changes as the search goes on.
+        """
+        if self.assignment_complete(assignment):
+            yield assignment
+            return
+        var = self.select_unassigned_variable(assignment)
+        for val in self.order_domain_values(var, assignment):
+            if val in assignment.values():
+                continue
+            assignment[var] = val
+            self.stats.assignments += 1
+            mark = len(self.trail)
+            self.set_domain(var.id, 1 << self.index.id(val))
+            arcs = deque(
+                (z, l, var.id, k)
+                for z, k, l in self.crossword.adjacency[var.id]
+            )
+            if self.propagate(arcs):
+                yield from self.search(assignment)
+            self.undo(mark)
+            del assignment[var]
+            self.stats.backtracks += 1
+
+    def count_failure(self):
+        """
+        Count a failed value, raising SearchLimit once over the limit of
+        the current attempt, or BudgetExhausted once over the budget of
+        the whole solve.
+        """
+        self.failures += 1
+        self.spent += 1
+        self.stats.backtracks += 1
+        if self.budget is not None and self.spent > self.budget:
+            raise BudgetExhausted()
+        if self.limit is not None and self.failures > self.limit:
+            raise SearchLimit()
+
+    def backjump(self, assignment):
+        """
+        Like `backtrack`, but with conflict-directed backjumping.
+
+        Return a tuple `(result, conflict)`. If no assignment is possible,
+        `result` is None and `conflict` is the set of IDs of assigned
+        variables responsible for the failure; search then jumps straight
+        back to the most recently assigned of them, skipping every
+        variable in between.
+        """
+        if self.assignment_complete(assignment):
+            return assignment, None
+        var = self.select_unassigned_variable(assignment)
+        conflict = set()
+        for val in self.order_domain_values(var, assignment):
+
+            # The word is already used by another variable
+            used = [w.id for w, word in assignment.items() if word == val]
+            if used:
+                conflict.update(used)
+                continue
+
+            # The word completes a known nogood
+            nogood = self.find_nogood(var.id, val, assignment)
+            if nogood is not None:
+                conflict.update(c for c, _ in nogood if c != var.id)
+                continue
+
+            assignment[var] = val
+            self.stats.assignments += 1
+            mark = len(self.trail)
+            self.set_domain(var.id, 1 << self.index.id(val), {var.id})
+            arcs = deque(
+                (z, l, var.id, k)
+                for z, k, l in self.crossword.adjacency[var.id]
+            )
+            if self.propagate(arcs):
+                result, reason = self.backjump(assignment)
+                if result is not None:
+                    return result, None
+
+                # Nothing assigned here caused the failure: jump past var
+                if var.id not in reason:
+                    self.undo(mark)
+                    del assignment[var]
+                    self.count_failure()
+                    return None, reason
             else:
-                del assignment[var]
+                reason = self.culprits[self.wiped]
+            reason = set(reason) - {var.id}
+            self.undo(mark)
+            del assignment[var]
+            self.add_nogood(var.id, val, reason, assignment)
+            conflict.update(reason)
+            self.count_failure()
+
+        # Values pruned from var's domain were ruled out by its culprits
+        conflict.update(self.culprits[var.id])
+        return None, conflict
+
+    def find_nogood(self, var, val, assignment):
+        """
+        Return a stored nogood that assigning `val` to the variable with ID
+        `var` would complete under `assignment`, or None if there is none.
+        """
+        variables = self.crossword.variable_list
+        for nogood in self.nogood_index.get((var, val), ()):
+            if all(
+                c == var or assignment.get(variables[c]) == word
+                for c, word in nogood
+            ):
+                self.nogoods.move_to_end(nogood)
+                return nogood
         return None
 
+    def add_nogood(self, var, val, reason, assignment):
+        """
+        Remember that assigning `val` to the variable with ID `var` fails
+        whenever the variables with IDs in `reason` keep their values in
+        `assignment`, evicting the least recently used nogood if the
+        store is full.
+        """
+        if self.nogood_limit <= 0:
+            return
+        variables = self.crossword.variable_list
+        nogood = frozenset(
+            [(c, assignment[variables[c]]) for c in reason] + [(var, val)]
+        )
+        if nogood in self.nogoods:
+            self.nogoods.move_to_end(nogood)
+            return
+        self.nogoods[nogood] = (var, val)
+        self.nogood_index.setdefault((var, val), set()).add(nogood)
+        if len(self.nogoods) > self.nogood_limit:
+            old, key = self.nogoods.popitem(last=False)
+            self.nogood_index[key].discard(old)
+            if not self.nogood_index[key]:
+                del self.nogood_index[key]
+
+
+def luby(k):
+    """
+    Return the kth term (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4,
+    1, 1, 2, 1, 1, 2, 4, 8, ... used to space out restarts.
+    """
+    size = 1
+    while size < k + 1:
+        size = 2 * size + 1
+    while size > 1:
+        size //= 2
+        if k == size + 1 or k == 2 * size + 1:
+            return size + 1 if k == 2 * size + 1 else 1
+        if k > size:
+            k -= size
+    return 1
+
 
 def main():
 
     # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    if len(sys.argv) not in [3, 4, 5]:
+        sys.exit("Usage: python generate.py structure words [output] "
+                 "[profile]")
 
     # Parse command-line arguments
     structure = sys.argv[1]
     words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    output = sys.argv[3] if len(sys.argv) >= 4 else None
+    profile = sys.argv[4] if len(sys.argv) == 5 else None
 
     # Generate crossword
     crossword = Crossword(structure, words)
     creator = CrosswordCreator(crossword)
     assignment = creator.solve()
+    if profile:
+        creator.stats.dump(profile)
 
     # Print result
     if assignment is None:
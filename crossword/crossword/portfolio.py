@@ -0,0 +1,137 @@
+"""
+Parallel portfolio solver for crossword.
+
+Several copies of `CrosswordCreator` race on the same puzzle in separate
+processes, each with its own seed and mix of heuristics. Randomized
+workers restart on a Luby schedule, so a run that gets stuck in a bad
+corner of the search is abandoned early. The first worker to finish with
+a definitive answer (a solution, or a proof that there is none) wins,
+and the rest are stopped.
+"""
+
+import queue
+import sys
+from multiprocessing import Process, Queue
+
+from crossword import *
+from generate import CrosswordCreator
+
+# Options for `CrosswordCreator.solve` tried by the workers in turn. The
+# first is the plain deterministic search, so a portfolio never does
+# worse than `generate.py` by more than the cost of the extra processes.
+CONFIGS = [
+    dict(),
+    dict(restart_base=100),
+    dict(backjump=True, nogoods=10000, restart_base=100),
+    dict(shuffle=True, restart_base=50),
+    dict(backjump=True, nogoods=10000),
+    dict(restart_base=500),
+    dict(backjump=True, nogoods=10000, shuffle=True, restart_base=200),
+    dict(restart_base=20)
+]
+
+# Seconds between checks that some worker is still running
+POLL_INTERVAL = 0.5
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [3, 4, 5]:
+        sys.exit("Usage: python portfolio.py structure words "
+                 "[processes] [output]")
+
+    # Parse command-line arguments
+    structure = sys.argv[1]
+    words = sys.argv[2]
+    processes = int(sys.argv[3]) if len(sys.argv) >= 4 else 4
+    output = sys.argv[4] if len(sys.argv) == 5 else None
+
+    # Generate crossword
+    crossword = Crossword(structure, words)
+    worker, assignment = solve_portfolio(crossword, processes)
+
+    # Print result
+    print(f"Worker {worker} finished first: {CONFIGS[worker % len(CONFIGS)]}")
+    if assignment is None:
+        print("No solution.")
+    else:
+        creator = CrosswordCreator(crossword)
+        creator.print(assignment)
+        if output:
+            creator.save(assignment, output)
+
+
+def solve_portfolio(crossword, processes=4, seed=0):
+    """
+    Solve `crossword` with `processes` differently configured workers and
+    return `(worker, assignment)` for the first worker to finish, where
+    `assignment` is None if the puzzle has no solution.
+
+    Raises RuntimeError if every worker exits without an answer.
+    """
+    results = Queue()
+    workers = [
+        Process(
+            target=_run_worker,
+            args=(crossword, k, seed + k, results),
+            daemon=True
+        )
+        for k in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    try:
+        worker, names = _first_result(results, workers)
+    finally:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+    if names is None:
+        return worker, None
+
+    # Variables don't survive the trip between processes with their
+    # identity intact, so map them back by position
+    return worker, {
+        var: names[var.id] for var in crossword.variable_list
+    }
+
+
+def _first_result(results, workers):
+    """
+    Return the first result posted to `results`, giving up once every
+    process in `workers` has exited without posting one.
+    """
+    while True:
+        try:
+            return results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if any(process.is_alive() for process in workers):
+                continue
+
+        # A worker may have posted just before exiting
+        try:
+            return results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            codes = [process.exitcode for process in workers]
+            raise RuntimeError(
+                f"Every worker exited without a result (exit codes {codes})"
+            )
+
+
+def _run_worker(crossword, worker, seed, results):
+    options = dict(CONFIGS[worker % len(CONFIGS)])
+    if worker > 0:
+        options["seed"] = seed
+    assignment = CrosswordCreator(crossword).solve(**options)
+    if assignment is None:
+        results.put((worker, None))
+    else:
+        results.put((worker, [
+            assignment[var] for var in crossword.variable_list
+        ]))
+
+
+if __name__ == "__main__":
+    main()
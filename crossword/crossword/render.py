@@ -0,0 +1,101 @@
+"""
+Image rendering for crossword.
+
+A `Renderer` loads the font once and keeps a pre-rendered tile for the
+empty cell and for every letter it has drawn. A puzzle is rendered by
+pasting those tiles onto a black canvas, so drawing many puzzles with
+the same renderer costs little more than copying pixels.
+"""
+
+import os
+import string
+
+FONT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "assets", "fonts", "OpenSans-Regular.ttf"
+)
+
+# Renderer shared by calls to `default_renderer`
+_default = None
+
+
+class Renderer():
+
+    def __init__(self, cell_size=100, cell_border=2, font=FONT,
+                 font_size=80):
+        """
+        Load the font and pre-render the empty cell and the letters A-Z.
+        """
+        from PIL import Image, ImageFont
+        self.cell_size = cell_size
+        self.cell_border = cell_border
+        self.font = ImageFont.truetype(font, font_size)
+
+        # A white square filling the cell inside its border
+        size = cell_size - 2 * cell_border + 1
+        self.blank = Image.new("RGBA", (size, size), "white")
+
+        # Letter tiles, made on first use for anything outside A-Z
+        self.glyphs = dict()
+        for letter in string.ascii_uppercase:
+            self.glyph(letter)
+
+    def glyph(self, letter):
+        """
+        Return the tile for a cell holding `letter`, with the letter
+        centered on it.
+        """
+        if letter not in self.glyphs:
+            from PIL import ImageDraw
+            tile = self.blank.copy()
+            draw = ImageDraw.Draw(tile)
+            left, top, right, bottom = draw.textbbox(
+                (0, 0), letter, font=self.font
+            )
+            draw.text(
+                ((tile.width - (right - left)) / 2 - left,
+                 (tile.height - (bottom - top)) / 2 - top),
+                letter, fill="black", font=self.font
+            )
+            self.glyphs[letter] = tile
+        return self.glyphs[letter]
+
+    def render(self, crossword, letters):
+        """
+        Return an image of `crossword` filled in with `letters`, a 2D
+        array of letters (or None for empty cells) as returned by
+        `CrosswordCreator.letter_grid`.
+        """
+        from PIL import Image
+        img = Image.new(
+            "RGBA",
+            (crossword.width * self.cell_size,
+             crossword.height * self.cell_size),
+            "black"
+        )
+        for i in range(crossword.height):
+            for j in range(crossword.width):
+                if not crossword.structure[i][j]:
+                    continue
+                tile = self.glyph(letters[i][j]) if letters[i][j] \
+                    else self.blank
+                img.paste(tile, (j * self.cell_size + self.cell_border,
+                                 i * self.cell_size + self.cell_border))
+        return img
+
+    def save(self, crossword, letters, filename):
+        """
+        Render `crossword` filled in with `letters` to an image file.
+        """
+        self.render(crossword, letters).save(filename)
+
+
+def default_renderer():
+    """
+    Return a renderer with the default settings, creating it on the first
+    call and reusing it afterwards.
+    """
+    global _default
+    if _default is None:
+        _default = Renderer()
+    return _default
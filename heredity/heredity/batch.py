@@ -0,0 +1,231 @@
+"""
+Batch processing of many family CSVs.
+
+Families are read from a directory or glob, grouped by a hash of their
+structure and evidence, and each distinct family is solved once on a
+pool of worker processes. Results are written to stdout as they arrive,
+one line per person, as JSON lines or CSV.
+"""
+
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+from multiprocessing import Pool
+
+from heredity import infer, load_data
+
+# Backends that can run inside pool workers (the samplers start
+# their own pools, which worker processes are not allowed to do)
+BATCH_BACKENDS = ("enumerate", "elimination", "vectorized")
+
+FORMATS = ("json", "csv")
+
+CSV_FIELDS = [
+    "file", "person", "gene_2", "gene_1", "gene_0", "trait_true", "trait_false"
+]
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3, 4, 5]:
+        sys.exit("Usage: python batch.py (directory|glob) "
+                 "[backend] [json|csv] [processes]")
+    files = find_families(sys.argv[1])
+    backend = sys.argv[2] if len(sys.argv) >= 3 else "elimination"
+    fmt = sys.argv[3] if len(sys.argv) >= 4 else "json"
+    processes = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    if backend not in BATCH_BACKENDS:
+        sys.exit(f"Unknown batch backend: {backend}")
+    if fmt not in FORMATS:
+        sys.exit(f"Unknown format: {fmt}")
+
+    writer = csv.writer(sys.stdout) if fmt == "csv" else None
+    if writer:
+        writer.writerow(CSV_FIELDS)
+    for filename, person, probabilities in run_batch(files, backend,
+                                                     processes):
+        if writer:
+            writer.writerow([
+                filename, person,
+                *(probabilities["gene"][g] for g in (2, 1, 0)),
+                *(probabilities["trait"][t] for t in (True, False))
+            ])
+        else:
+            print(json.dumps({
+                "file": filename,
+                "person": person,
+                "gene": probabilities["gene"],
+                "trait": probabilities["trait"]
+            }))
+        sys.stdout.flush()
+
+
+def find_families(path):
+    """
+    Return the sorted family CSV files in directory `path`, or matching
+    the glob pattern `path`.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "*.csv")
+    return sorted(glob.glob(path))
+
+
+def family_key(people):
+    """
+    Return `(key, canonical, index)` for the family in `people`.
+
+    `canonical` is the same family with each person renamed to their
+    position in a canonical ordering, `index` maps each name in `people`
+    to its canonical name, and `key` is a hash of `canonical`, so
+    families that differ only in names or row order share a key.
+
+    People are ordered by generation and then by a signature built from
+    their evidence, their parents' signatures and their children's.
+    People whose signatures still tie are interchangeable as far as the
+    refinement can tell, so one is singled out and refinement repeats.
+    """
+    children = {person: [] for person in people}
+    for person in people:
+        for role in ["mother", "father"]:
+            parent = people[person][role]
+            if parent is not None:
+                children[parent].append((role, person))
+
+    # Generation: founders are 0, everyone else one more than a parent
+    generation = dict()
+
+    def depth(person):
+        if person not in generation:
+            parents = [
+                people[person][role] for role in ["mother", "father"]
+                if people[person][role] is not None
+            ]
+            generation[person] = 1 + max(map(depth, parents), default=-1)
+        return generation[person]
+
+    for person in people:
+        depth(person)
+
+    def refine(signature):
+        distinct = len(set(signature.values()))
+        while True:
+            refined = {
+                person: hashlib.sha256(repr((
+                    signature[person],
+                    signature.get(people[person]["mother"]),
+                    signature.get(people[person]["father"]),
+                    sorted((role, signature[child])
+                           for role, child in children[person])
+                )).encode()).hexdigest()
+                for person in people
+            }
+            if len(set(refined.values())) == distinct:
+                return signature
+            signature = refined
+            distinct = len(set(refined.values()))
+
+    # Refine signatures until they stop telling people apart, then single
+    # out the first of any people still tied and refine again
+    signature = {
+        person: repr((generation[person], people[person]["trait"]))
+        for person in people
+    }
+    while True:
+        signature = refine(signature)
+        order = sorted(people, key=lambda person: (
+            generation[person], signature[person]
+        ))
+        tied = [
+            a for a, b in zip(order, order[1:])
+            if signature[a] == signature[b]
+        ]
+        if not tied:
+            break
+        signature[tied[0]] += "*"
+
+    index = {person: str(k) for k, person in enumerate(order)}
+    canonical = {
+        index[person]: {
+            "name": index[person],
+            "mother": index.get(people[person]["mother"]),
+            "father": index.get(people[person]["father"]),
+            "trait": people[person]["trait"]
+        }
+        for person in order
+    }
+    rows = [
+        (row["mother"], row["father"], row["trait"])
+        for row in canonical.values()
+    ]
+    key = hashlib.sha256(repr(rows).encode()).hexdigest()
+    return key, canonical, {person: index[person] for person in people}
+
+
+def run_batch(files, backend="elimination", processes=None):
+    """
+    Solve every family in `files` and yield `(filename, person,
+    probabilities)` for each person as results become available.
+    Structurally identical families are solved only once.
+
+    Files are read as the pool takes on work, so results for the first
+    families stream out while later files are still being parsed.
+    """
+
+    # Results of each family once solved, and the files waiting on it.
+    # Jobs are generated on the pool's task thread, hence the lock
+    families = dict()
+    ready = []
+    lock = threading.Lock()
+
+    def jobs():
+        for filename in files:
+            key, canonical, index = family_key(load_data(filename))
+            with lock:
+                family = families.get(key)
+                if family is None:
+                    families[key] = {"results": None,
+                                     "files": [(filename, index)]}
+                elif family["results"] is None:
+                    family["files"].append((filename, index))
+                    continue
+                else:
+                    ready.append((filename, index, family["results"]))
+                    continue
+            yield key, canonical, backend
+
+    def drain():
+        with lock:
+            done = list(ready)
+            ready.clear()
+        for filename, index, results in done:
+            for person, name in index.items():
+                yield filename, person, results[name]
+
+    with Pool(processes) as pool:
+        for key, results in pool.imap_unordered(_solve, jobs()):
+            with lock:
+                family = families[key]
+                family["results"] = results
+                ready.extend(
+                    (filename, index, results)
+                    for filename, index in family["files"]
+                )
+                family["files"] = []
+            yield from drain()
+
+    # Files that repeated a family solved before they were read
+    yield from drain()
+
+
+def _solve(job):
+    key, people, backend = job
+    return key, infer(people, backend)
+
+
+if __name__ == "__main__":
+    main()
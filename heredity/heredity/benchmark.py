@@ -0,0 +1,109 @@
+"""
+Inference benchmark for heredity.
+
+Times every backend on synthetic pedigrees of growing size, and checks
+every backend against the brute-force enumerator on families small
+enough to enumerate.
+"""
+
+import sys
+import time
+
+from heredity import BACKENDS, infer
+from pedigree import generate_pedigree
+from sampling import sample_probabilities
+
+# Largest family each exact backend is run on
+SIZE_LIMITS = {
+    "enumerate": 8,
+    "vectorized": 13,
+    "elimination": 2000
+}
+
+# Largest acceptable difference from the enumerator
+TOLERANCE = {
+    "enumerate": 1e-9,
+    "elimination": 1e-9,
+    "vectorized": 1e-9,
+    "likelihood": 0.05,
+    "gibbs": 0.05
+}
+
+# Round budget for the samplers, so that unconverged runs still finish
+SAMPLING_ROUNDS = 50
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [1, 2, 3, 4]:
+        sys.exit("Usage: python benchmark.py [generations] [branching] [seed]")
+    generations = int(sys.argv[1]) if len(sys.argv) >= 2 else 5
+    branching = int(sys.argv[2]) if len(sys.argv) >= 3 else 2
+    seed = int(sys.argv[3]) if len(sys.argv) == 4 else 0
+
+    print(f"{'people':>6}  {'backend':<12}{'seconds':>10}  check")
+    for g in range(1, generations + 1):
+        people = generate_pedigree(
+            generations=g, branching=branching, seed=seed
+        )
+        for result in benchmark(people):
+            print(f"{result['people']:>6}  {result['backend']:<12}"
+                  f"{result['seconds']:>10.4f}  {result['check']}")
+
+
+def benchmark(people):
+    """
+    Run every backend that can handle the family in `people` and return a
+    list of results, each with the backend, family size, time taken and
+    the outcome of checking it against the enumerator.
+    """
+    reference = None
+    if len(people) <= SIZE_LIMITS["enumerate"]:
+        reference = infer(people, "enumerate")
+
+    results = []
+    for backend in BACKENDS:
+        if len(people) > SIZE_LIMITS.get(backend, len(people)):
+            continue
+        start = time.perf_counter()
+        if backend in ["likelihood", "gibbs"]:
+            probabilities, diagnostics = sample_probabilities(
+                people, backend, max_rounds=SAMPLING_ROUNDS
+            )
+        else:
+            probabilities, diagnostics = infer(people, backend), None
+        seconds = time.perf_counter() - start
+
+        if reference is not None:
+            error = max_difference(reference, probabilities)
+            check = "ok" if error <= TOLERANCE[backend] else "FAIL"
+            check += f" (error {error:.2e})"
+        else:
+            check = "-"
+        if diagnostics is not None:
+            check += (f" rhat={diagnostics['rhat']:.3f}"
+                      f" ess={diagnostics['ess']:.0f}")
+        results.append({
+            "backend": backend,
+            "people": len(people),
+            "seconds": seconds,
+            "check": check
+        })
+    return results
+
+
+def max_difference(a, b):
+    """
+    Return the largest difference between two sets of distributions.
+    """
+    return max(
+        abs(a[person][field][value] - b[person][field][value])
+        for person in a
+        for field in a[person]
+        for value in a[person][field]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Exact inference for heredity by variable elimination.
+
+A family is compiled into factors over gene variables using `PROBS`,
+with observed traits entered as likelihood factors. Eliminating the
+variables in min-fill order builds a clique tree, which is then
+calibrated with one upward and one downward pass of messages, so every
+person's marginals come out of a single run. For tree-like families the
+cliques stay small and the work is linear in the number of people.
+"""
+
+import itertools
+
+from heredity import (
+    PROBS, empty_probabilities, inheritance_probability
+)
+
+GENES = (2, 1, 0)
+TRAITS = (True, False)
+
+
+class Factor():
+
+    def __init__(self, variables, table):
+        """
+        Create a factor over the tuple `variables`, whose `table` maps
+        tuples of values (in the order of `variables`) to numbers.
+        Missing entries are zero.
+        """
+        self.variables = tuple(variables)
+        self.table = table
+
+    @classmethod
+    def product(cls, factors, domains):
+        """
+        Return the product of `factors`, where `domains` maps each
+        variable to the values it can take.
+        """
+        variables = []
+        for factor in factors:
+            for var in factor.variables:
+                if var not in variables:
+                    variables.append(var)
+        positions = [
+            tuple(variables.index(var) for var in factor.variables)
+            for factor in factors
+        ]
+        table = dict()
+        for values in itertools.product(*(domains[var] for var in variables)):
+            p = 1
+            for factor, pos in zip(factors, positions):
+                p *= factor.table.get(tuple(values[k] for k in pos), 0)
+                if p == 0:
+                    break
+            if p:
+                table[values] = p
+        return cls(variables, table)
+
+    def marginalize(self, keep):
+        """
+        Return this factor with every variable not in `keep` summed out.
+        """
+        variables = tuple(var for var in self.variables if var in keep)
+        pos = tuple(self.variables.index(var) for var in variables)
+        table = dict()
+        for values, p in self.table.items():
+            key = tuple(values[k] for k in pos)
+            table[key] = table.get(key, 0) + p
+        return Factor(variables, table)
+
+
+def eliminate_probabilities(people):
+    """
+    Compute gene and trait distributions for everyone in `people` by
+    variable elimination over the family's clique tree.
+    """
+    domains, factors = compile_family(people)
+    cliques = build_clique_tree(domains, factors)
+    calibrate(cliques, domains)
+
+    # Read each gene's marginal off the clique that eliminated it
+    probabilities = empty_probabilities(people)
+    for clique in cliques:
+        _, person = clique["variable"]
+        belief = Factor.product(
+            clique["factors"] + list(clique["inbox"].values()), domains
+        ).marginalize({clique["variable"]})
+        total = sum(belief.table.values())
+        for (value,), p in belief.table.items():
+            probabilities[person]["gene"][value] = p / total
+
+    # Traits are leaves, so their marginals follow from the genes
+    for person in people:
+        if people[person]["trait"] is not None:
+            probabilities[person]["trait"][people[person]["trait"]] = 1
+            continue
+        for trait in TRAITS:
+            probabilities[person]["trait"][trait] = sum(
+                probabilities[person]["gene"][g] * PROBS["trait"][g][trait]
+                for g in GENES
+            )
+    return probabilities
+
+
+def compile_family(people):
+    """
+    Return `(domains, factors)` for the family in `people`.
+
+    Each person has a ("gene", name) variable. Traits are not variables:
+    an observed trait enters as a likelihood factor on the person's gene,
+    and an unobserved trait sums to one and drops out of the model.
+    """
+    domains = dict()
+    factors = []
+    for person in people:
+        gene = ("gene", person)
+        domains[gene] = GENES
+
+        # Likelihood of the observed trait given the gene
+        trait = people[person]["trait"]
+        if trait is not None:
+            factors.append(Factor((gene,), {
+                (g,): PROBS["trait"][g][trait] for g in GENES
+            }))
+
+        # Probability of the gene, unconditionally or given the parents
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother is None:
+            factors.append(Factor((gene,), {
+                (g,): PROBS["gene"][g] for g in GENES
+            }))
+        else:
+            factors.append(Factor(
+                (gene, ("gene", mother), ("gene", father)),
+                {
+                    (g, m, f): inheritance_probability(g, m, f)
+                    for g in GENES for m in GENES for f in GENES
+                }
+            ))
+    return domains, factors
+
+
+def elimination_order(domains, factors):
+    """
+    Return an order in which to eliminate the variables in `domains`,
+    greedily choosing the variable whose elimination adds the fewest
+    edges to the interaction graph (min-fill).
+    """
+    graph = {var: set() for var in domains}
+    for factor in factors:
+        for a, b in itertools.permutations(factor.variables, 2):
+            graph[a].add(b)
+
+    def fill(var):
+        neighbors = list(graph[var])
+        return sum(
+            1 for a, b in itertools.combinations(neighbors, 2)
+            if b not in graph[a]
+        )
+
+    cost = {var: (fill(var), len(graph[var])) for var in graph}
+    order = []
+    while cost:
+        var = min(cost, key=lambda v: (cost[v], v))
+        order.append(var)
+        neighbors = graph.pop(var)
+        del cost[var]
+        for a in neighbors:
+            graph[a].discard(var)
+            graph[a].update(neighbors - {a})
+
+        # Only the eliminated variable's neighborhood can change cost
+        affected = set(neighbors)
+        for a in neighbors:
+            affected.update(graph[a])
+        for a in affected:
+            cost[a] = (fill(a), len(graph[a]))
+    return order
+
+
+def build_clique_tree(domains, factors):
+    """
+    Run variable elimination over `factors` and return the clique tree it
+    induces, as a list of cliques in elimination order.
+
+    Each clique is a dictionary with
+        - `variable`: the variable eliminated to create it
+        - `scope`: the variables of the clique
+        - `factors`: the original factors assigned to it
+        - `parent`: index of the clique that consumed its message, or None
+        - `separator`: the variables of the message sent to the parent
+        - `inbox`: messages received so far, keyed by sender index
+    """
+    order = elimination_order(domains, factors)
+    pending = [(None, factor) for factor in factors]
+    cliques = []
+    for index, var in enumerate(order):
+        used = [item for item in pending if var in item[1].variables]
+        pending = [item for item in pending if var not in item[1].variables]
+        clique = {
+            "variable": var,
+            "factors": [factor for sender, factor in used if sender is None],
+            "parent": None,
+            "inbox": {
+                sender: factor
+                for sender, factor in used if sender is not None
+            }
+        }
+        for sender in clique["inbox"]:
+            cliques[sender]["parent"] = index
+        scope = set()
+        for _, factor in used:
+            scope.update(factor.variables)
+        clique["scope"] = scope
+        clique["separator"] = scope - {var}
+
+        # Upward message: sum the clique's variable out of everything
+        # it has received
+        message = Factor.product(
+            [factor for _, factor in used], domains
+        ).marginalize(clique["separator"])
+        cliques.append(clique)
+        if clique["separator"]:
+            pending.append((index, message))
+    return cliques
+
+
+def calibrate(cliques, domains):
+    """
+    Send messages from every clique down to the cliques that sent it
+    their upward messages, so each clique's inbox holds a message from
+    every neighbor.
+    """
+    children = [[] for _ in cliques]
+    for index, clique in enumerate(cliques):
+        if clique["parent"] is not None:
+            children[clique["parent"]].append(index)
+
+    # Parents are always eliminated after their children, so walking the
+    # cliques in reverse visits each parent before its children
+    for index in reversed(range(len(cliques))):
+        clique = cliques[index]
+        for child in children[index]:
+            others = [
+                factor for sender, factor in clique["inbox"].items()
+                if sender != child
+            ]
+            message = Factor.product(
+                clique["factors"] + others, domains
+            ).marginalize(cliques[child]["separator"])
+            cliques[child]["inbox"][index] = message
@@ -37,15 +37,56 @@ PROBS = {
 }
 
 
+BACKENDS = ("enumerate", "elimination", "vectorized", "likelihood", "gibbs")
+
+
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python heredity.py data.csv [backend]")
     people = load_data(sys.argv[1])
+    backend = sys.argv[2] if len(sys.argv) == 3 else "enumerate"
+    if backend not in BACKENDS:
+        sys.exit(f"Unknown backend: {backend}")
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
+    # Compute gene and trait probabilities for each person
+    probabilities = infer(people, backend)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def infer(people, backend="enumerate"):
+    """
+    Return normalized gene and trait distributions for everyone in
+    `people`, computed by the inference backend named `backend`.
+    """
+    if backend == "enumerate":
+        return enumerate_probabilities(people)
+    elif backend == "elimination":
+        from elimination import eliminate_probabilities
+        return eliminate_probabilities(people)
+    elif backend == "vectorized":
+        from vectorized import vectorized_probabilities
+        return vectorized_probabilities(people)
+    elif backend in ["likelihood", "gibbs"]:
+        from sampling import sample_probabilities
+        return sample_probabilities(people, backend)[0]
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def empty_probabilities(people):
+    """
+    Return a distribution for everyone in `people` with all zero entries.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -60,38 +101,33 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+def enumerate_probabilities(people):
+    """
+    Compute gene and trait distributions by summing over every possible
+    assignment of genes.
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+    Traits are leaves of the model, so they are never enumerated: observed
+    traits enter as likelihood factors, and unobserved traits are
+    marginalized analytically for each gene assignment.
+    """
+
+    # Keep track of gene and trait probabilities for each person
+    probabilities = empty_probabilities(people)
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Loop over all sets of people who might have the gene
+    names = set(people)
+    for one_gene in powerset(names):
+        for two_genes in powerset(names - one_gene):
+
+            # Update probabilities with the probability of these genes
+            # together with the observed traits
+            p = evidence_probability(people, one_gene, two_genes)
+            update_marginal(probabilities, people, one_gene, two_genes, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
-
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return probabilities
 
 
 def load_data(filename):
@@ -139,31 +175,76 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
-    probs = 1
-    children = []
+    probs = gene_probability(people, one_gene, two_genes)
     for person in people:
         gene = (person in one_gene) + 2 * (person in two_genes)
-        people[person]["gene"] = gene
-        if people[person]["mother"] == None:
-            probs *= (PROBS["gene"][gene]*PROBS["trait"][gene][person in have_trait])
-        else:
-            children.append(person)
-    for child in children:
-        gene = (child in one_gene) + 2 * (child in two_genes)
-        mother = people[child]["mother"]
-        ma_gene = people[mother]["gene"]
-        inherit_ma = 0.01 * (ma_gene == 0) + 0.5 * 0.99 * (ma_gene == 1) + 0.99 * (ma_gene == 2)
-        father = people[child]["father"]
-        fa_gene = people[father]["gene"]
-        inherit_fa = 0.01 * (fa_gene == 0) + 0.5 * 0.99 * (fa_gene == 1) + 0.99 * (fa_gene == 2)
-        if gene == 0:
-            probs *= ((1 - inherit_fa) * (1 - inherit_ma))
-        elif gene == 1:
-            probs *= ((inherit_fa) * (1 - inherit_ma) + (inherit_ma) * (1 - inherit_fa))
+        probs *= PROBS["trait"][gene][person in have_trait]
+    return probs
+
+
+def gene_probability(people, one_gene, two_genes):
+    """
+    Compute the probability that everyone in `one_gene` has one copy of
+    the gene, everyone in `two_genes` has two copies, and everyone else
+    has none, ignoring traits.
+    """
+    genes = {
+        person: (person in one_gene) + 2 * (person in two_genes)
+        for person in people
+    }
+    probs = 1
+    for person in people:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        if mother is None:
+            probs *= PROBS["gene"][genes[person]]
         else:
-            probs *= (inherit_fa * inherit_ma)
+            probs *= inheritance_probability(
+                genes[person], genes[mother], genes[father]
+            )
+    return probs
+
+
+def evidence_probability(people, one_gene, two_genes):
+    """
+    Compute the probability of the gene assignment given by `one_gene`
+    and `two_genes` together with every observed trait in `people`.
+    """
+    probs = gene_probability(people, one_gene, two_genes)
+    for person in people:
+        if people[person]["trait"] is not None:
+            gene = (person in one_gene) + 2 * (person in two_genes)
+            probs *= PROBS["trait"][gene][people[person]["trait"]]
     return probs
 
+
+def passing_probability(gene):
+    """
+    Return the probability that a parent with `gene` copies of the gene
+    passes a copy on to a child, accounting for mutation.
+    """
+    if gene == 0:
+        return PROBS["mutation"]
+    elif gene == 1:
+        return 0.5
+    else:
+        return 1 - PROBS["mutation"]
+
+
+def inheritance_probability(gene, mother_gene, father_gene):
+    """
+    Return the probability that a child has `gene` copies of the gene
+    given how many copies their mother and father have.
+    """
+    inherit_ma = passing_probability(mother_gene)
+    inherit_fa = passing_probability(father_gene)
+    if gene == 0:
+        return (1 - inherit_fa) * (1 - inherit_ma)
+    elif gene == 1:
+        return inherit_fa * (1 - inherit_ma) + inherit_ma * (1 - inherit_fa)
+    else:
+        return inherit_fa * inherit_ma
+
 def update(probabilities, one_gene, two_genes, have_trait, p):
     """
     Add to `probabilities` a new joint probability `p`.
@@ -178,6 +259,24 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
         probabilities[person]["trait"][ptrait] += p
 
 
+def update_marginal(probabilities, people, one_gene, two_genes, p):
+    """
+    Add to `probabilities` the probability `p` of a gene assignment and
+    the observed traits.
+    Observed traits receive all of `p`; unobserved traits are split
+    according to the probability of the trait given the person's gene.
+    """
+    for person in probabilities:
+        pgene = (person in one_gene) + 2 * (person in two_genes)
+        probabilities[person]["gene"][pgene] += p
+        if people[person]["trait"] is None:
+            for ptrait in [True, False]:
+                probabilities[person]["trait"][ptrait] += (
+                    p * PROBS["trait"][pgene][ptrait]
+                )
+        else:
+            probabilities[person]["trait"][people[person]["trait"]] += p
+
 
 def normalize(probabilities):
     """
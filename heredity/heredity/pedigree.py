@@ -0,0 +1,114 @@
+"""
+Random pedigree generator for heredity.
+
+Pedigrees start from a single founding couple. Every couple has
+`branching` children, and each child either marries a new founder (with
+probability `founder_fraction`) or another child of the same generation,
+which creates the loops found in real pedigrees. Genes and traits are
+drawn from `PROBS`, and each trait is kept as evidence with probability
+`observed_ratio`.
+"""
+
+import csv
+import random
+import sys
+
+from heredity import PROBS, inheritance_probability
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [5, 6]:
+        sys.exit("Usage: python pedigree.py generations branching "
+                 "founder_fraction observed_ratio [seed]")
+    people = generate_pedigree(
+        generations=int(sys.argv[1]),
+        branching=int(sys.argv[2]),
+        founder_fraction=float(sys.argv[3]),
+        observed_ratio=float(sys.argv[4]),
+        seed=int(sys.argv[5]) if len(sys.argv) == 6 else None
+    )
+    write_family(people, sys.stdout)
+
+
+def generate_pedigree(generations=3, branching=2, founder_fraction=0.5,
+                      observed_ratio=0.5, seed=None):
+    """
+    Return a random family in the format of `load_data`, spanning
+    `generations` generations.
+    """
+    rng = random.Random(seed)
+    people = dict()
+    genes = dict()
+
+    def add(mother=None, father=None):
+        name = f"P{len(people)}"
+        if mother is None:
+            probs = [PROBS["gene"][g] for g in range(3)]
+        else:
+            probs = [
+                inheritance_probability(g, genes[mother], genes[father])
+                for g in range(3)
+            ]
+        genes[name] = rng.choices(range(3), probs)[0]
+        trait = rng.random() < PROBS["trait"][genes[name]][True]
+        people[name] = {
+            "name": name,
+            "mother": mother,
+            "father": father,
+            "trait": trait if rng.random() < observed_ratio else None
+        }
+        return name
+
+    couples = [(add(), add())]
+    for _ in range(generations - 1):
+
+        # Every couple of the previous generation has children
+        children = []
+        for mother, father in couples:
+            for _ in range(branching):
+                children.append(add(mother, father))
+
+        # Children marry new founders or each other
+        rng.shuffle(children)
+        couples = []
+        single = []
+        for child in children:
+            if rng.random() < founder_fraction:
+                couples.append(_order(rng, child, add()))
+            elif single:
+                couples.append(_order(rng, child, single.pop()))
+            else:
+                single.append(child)
+        for child in single:
+            couples.append(_order(rng, child, add()))
+    return people
+
+
+def _order(rng, a, b):
+    """
+    Return partners `a` and `b` as a (mother, father) pair in random order.
+    """
+    return (a, b) if rng.random() < 0.5 else (b, a)
+
+
+def write_family(people, f):
+    """
+    Write the family in `people` to file object `f` as a CSV in the
+    format read by `load_data`.
+    """
+    writer = csv.writer(f)
+    writer.writerow(["name", "mother", "father", "trait"])
+    for person in people.values():
+        trait = person["trait"]
+        writer.writerow([
+            person["name"],
+            person["mother"] or "",
+            person["father"] or "",
+            "" if trait is None else int(trait)
+        ])
+
+
+if __name__ == "__main__":
+    main()
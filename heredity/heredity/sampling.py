@@ -0,0 +1,338 @@
+"""
+Approximate inference for heredity by sampling.
+
+Two samplers are available over the gene network defined by `PROBS`:
+    - "likelihood": likelihood weighting, drawing genes forward from the
+      founders and weighting each sample by the observed traits
+    - "gibbs": Gibbs sampling, resampling one person's gene at a time
+      from its distribution given everyone else
+
+Several independent chains run in a process pool. They advance in
+rounds, and after each round the chains are compared with R-hat and an
+effective sample size. Sampling stops as soon as both are good enough.
+Gibbs chains start from a draw from the prior, so each first runs
+`burn_in` sweeps that are discarded before any sample is counted.
+Unobserved traits are never sampled: each sample contributes the
+probability of the trait given the sampled gene.
+"""
+
+import math
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from heredity import PROBS, empty_probabilities, inheritance_probability
+
+METHODS = ("likelihood", "gibbs")
+
+# Default stopping rule
+ROUND_SIZE = 500
+BURN_IN = 500
+MAX_ROUNDS = 200
+RHAT_TARGET = 1.01
+ESS_TARGET = 2000
+
+# Model shared by the chains of a worker process, set by `_init_worker`
+_model = dict()
+
+
+def sample_probabilities(people, method="gibbs", chains=4, processes=None,
+                         seed=0, round_size=ROUND_SIZE, burn_in=BURN_IN,
+                         max_rounds=MAX_ROUNDS, rhat_target=RHAT_TARGET,
+                         ess_target=ESS_TARGET):
+    """
+    Estimate gene and trait distributions for everyone in `people` with
+    `chains` independent chains of `method`, run on `processes` worker
+    processes. Gibbs chains discard their first `burn_in` sweeps.
+
+    Return a tuple `(probabilities, diagnostics)`, where `diagnostics` is
+    a dictionary with the number of `rounds` and `samples` drawn, the
+    worst `rhat` and `ess` over all estimated probabilities, and whether
+    the chains `converged` before `max_rounds` was reached.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown sampling method: {method}")
+    model = compile_model(people)
+    seeds = np.random.SeedSequence(seed).spawn(chains)
+    states = [
+        {
+            "method": method,
+            "rng": random.Random(int(s.generate_state(1)[0])).getstate(),
+            "genes": None,
+            "size": round_size,
+            "burn_in": burn_in
+        }
+        for s in seeds
+    ]
+
+    # Per-chain, per-round weighted gene counts and weight totals
+    counts = [[] for _ in range(chains)]
+    weights = [[] for _ in range(chains)]
+
+    with Pool(processes, initializer=_init_worker, initargs=(model,)) as pool:
+        for rounds in range(1, max_rounds + 1):
+            results = pool.map(_run_round, states)
+            for c, (state, gene_counts, w, w2) in enumerate(results):
+                states[c] = state
+                counts[c].append(gene_counts)
+                weights[c].append((w, w2))
+            rhat, ess = diagnose(model, counts, weights)
+            if rounds >= 2 and rhat < rhat_target and ess >= ess_target:
+                break
+
+    # Pool every chain's samples into the final estimate
+    total = sum(np.sum(chain, axis=0) for chain in counts)
+    probabilities = estimate(model, people, total)
+    diagnostics = {
+        "rounds": rounds,
+        "samples": rounds * round_size * chains,
+        "rhat": rhat,
+        "ess": ess,
+        "converged": rhat < rhat_target and ess >= ess_target
+    }
+    return probabilities, diagnostics
+
+
+def compile_model(people):
+    """
+    Return a dictionary describing the family in `people` by integer
+    indices, with people listed so that parents come before children.
+    """
+    names = []
+    seen = set()
+
+    def visit(person):
+        if person in seen:
+            return
+        seen.add(person)
+        for parent in (people[person]["mother"], people[person]["father"]):
+            if parent is not None:
+                visit(parent)
+        names.append(person)
+
+    for person in people:
+        visit(person)
+    index = {person: k for k, person in enumerate(names)}
+
+    parents = [
+        None if people[person]["mother"] is None else
+        (index[people[person]["mother"]], index[people[person]["father"]])
+        for person in names
+    ]
+    children = [[] for _ in names]
+    for k, pair in enumerate(parents):
+        if pair is not None:
+            children[pair[0]].append(k)
+            children[pair[1]].append(k)
+
+    return {
+        "names": names,
+        "parents": parents,
+        "children": children,
+        "evidence": [people[person]["trait"] for person in names],
+        "inherit": [
+            [[inheritance_probability(g, m, f) for g in range(3)]
+             for f in range(3)]
+            for m in range(3)
+        ]
+    }
+
+
+def estimate(model, people, gene_counts):
+    """
+    Turn weighted gene counts, one row per person in model order, into
+    normalized gene and trait distributions.
+    """
+    probabilities = empty_probabilities(people)
+    for k, person in enumerate(model["names"]):
+        total = gene_counts[k].sum()
+        for g in range(3):
+            probabilities[person]["gene"][g] = gene_counts[k][g] / total
+        trait = model["evidence"][k]
+        if trait is not None:
+            probabilities[person]["trait"][trait] = 1
+            continue
+        for t in (True, False):
+            probabilities[person]["trait"][t] = sum(
+                probabilities[person]["gene"][g] * PROBS["trait"][g][t]
+                for g in range(3)
+            )
+    return probabilities
+
+
+def diagnose(model, counts, weights):
+    """
+    Return `(rhat, ess)`: the largest potential scale reduction factor and
+    the smallest effective sample size over every estimated probability,
+    given per-chain, per-round weighted gene counts and weight totals.
+
+    Within-chain variance of the pooled samples and the spread of the
+    chain means give R-hat; the spread of the round means within each
+    chain gives a batch-means effective sample size.
+    """
+    chains = len(counts)
+    rounds = len(counts[0])
+    if rounds < 2:
+        return math.inf, 0
+
+    # Each estimated probability is the weighted mean of a per-sample
+    # value x(g) of the person's gene: an indicator of each gene count,
+    # and for unobserved traits the probability of the trait
+    values = [np.eye(3)]
+    values.append(np.array([[PROBS["trait"][g][True] for g in range(3)]]))
+    unobserved = np.array([trait is None for trait in model["evidence"]])
+
+    counts = np.array(counts)                   # chains, rounds, people, 3
+    w = np.array(weights)[:, :, 0]              # chains, rounds
+    w2 = np.array(weights)[:, :, 1]
+    rhat = 1
+    ess = math.inf
+    for table in values:
+        sums = counts @ table.T                 # sum of w * x
+        squares = counts @ (table ** 2).T       # sum of w * x^2
+        if len(table) == 1:
+            sums = sums[:, :, unobserved]
+            squares = squares[:, :, unobserved]
+        if sums.size == 0:
+            continue
+
+        # Chain means and within-chain variances
+        chain_w = w.sum(axis=1)[:, None, None]
+        means = sums.sum(axis=1) / chain_w
+        variances = squares.sum(axis=1) / chain_w - means ** 2
+        n = (chain_w[:, 0, 0] ** 2 / w2.sum(axis=1)).mean()
+
+        within = variances.mean(axis=0)
+        between = means.var(axis=0, ddof=1) if chains > 1 else 0 * within
+        pooled = (n - 1) / n * within + between
+        mixing = within > 1e-12
+        if mixing.any():
+            rhat = max(rhat, float(np.sqrt(
+                pooled[mixing] / within[mixing]
+            ).max()))
+
+        # Batch means over rounds
+        round_means = sums / w[:, :, None, None]
+        batch = round_means.var(axis=1, ddof=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            chain_ess = np.where(
+                batch > 1e-15, variances * rounds / batch, n
+            )
+        chain_ess = np.minimum(chain_ess, n).sum(axis=0)
+        if mixing.any():
+            ess = min(ess, float(chain_ess[mixing].min()))
+    return rhat, ess
+
+
+def _init_worker(model):
+    _model.update(model)
+
+
+def _run_round(state):
+    """
+    Advance one chain by one round of samples, after its burn-in if it
+    is a Gibbs chain that has not started yet, returning
+    `(state, gene_counts, w, w2)` where `gene_counts` holds the total
+    sample weight of each gene count for each person, and `w` and `w2`
+    are the sums of the weights and of the squared weights.
+    """
+    rng = random.Random()
+    rng.setstate(state["rng"])
+    size = len(_model["names"])
+    gene_counts = np.zeros((size, 3))
+    rows = [[0.0, 0.0, 0.0] for _ in range(size)]
+    w_total = 0
+    w2_total = 0
+
+    if state["method"] == "likelihood":
+        for _ in range(state["size"]):
+            genes, weight = _forward_sample(rng)
+            for k, g in enumerate(genes):
+                rows[k][g] += weight
+            w_total += weight
+            w2_total += weight * weight
+    else:
+        genes = state["genes"]
+        if genes is None:
+            genes = _initial_state(rng)
+            for _ in range(state["burn_in"]):
+                _gibbs_sweep(genes, rng)
+        for _ in range(state["size"]):
+            _gibbs_sweep(genes, rng)
+            for k, g in enumerate(genes):
+                rows[k][g] += 1
+        w_total = w2_total = state["size"]
+        state = dict(state, genes=genes)
+
+    gene_counts[:] = rows
+    return dict(state, rng=rng.getstate()), gene_counts, w_total, w2_total
+
+
+def _draw(rng, probs):
+    """
+    Draw an index from the unnormalized distribution `probs`.
+    """
+    r = rng.random() * sum(probs)
+    for k, p in enumerate(probs):
+        r -= p
+        if r < 0:
+            return k
+    return len(probs) - 1
+
+
+def _forward_sample(rng):
+    """
+    Draw genes for everyone from the prior, parents first, and return
+    `(genes, weight)` where `weight` is the likelihood of the evidence.
+    """
+    prior = [PROBS["gene"][g] for g in range(3)]
+    genes = []
+    weight = 1
+    for k, pair in enumerate(_model["parents"]):
+        if pair is None:
+            g = _draw(rng, prior)
+        else:
+            g = _draw(rng, _model["inherit"][genes[pair[0]]][genes[pair[1]]])
+        genes.append(g)
+        if _model["evidence"][k] is not None:
+            weight *= PROBS["trait"][g][_model["evidence"][k]]
+    return genes, weight
+
+
+def _initial_state(rng):
+    """
+    Return a starting gene assignment for a Gibbs chain, drawn from the
+    prior so that it has nonzero probability.
+    """
+    genes, _ = _forward_sample(rng)
+    return genes
+
+
+def _gibbs_sweep(genes, rng):
+    """
+    Resample every person's gene in turn from its distribution given the
+    genes of everyone else and the observed traits.
+    """
+    parents = _model["parents"]
+    inherit = _model["inherit"]
+    for k in range(len(genes)):
+        pair = parents[k]
+        trait = _model["evidence"][k]
+        probs = []
+        for g in range(3):
+            if pair is None:
+                p = PROBS["gene"][g]
+            else:
+                p = inherit[genes[pair[0]]][genes[pair[1]]][g]
+            if trait is not None:
+                p *= PROBS["trait"][g][trait]
+            for child in _model["children"][k]:
+                mother, father = parents[child]
+                p *= inherit[
+                    g if mother == k else genes[mother]
+                ][
+                    g if father == k else genes[father]
+                ][genes[child]]
+            probs.append(p)
+        genes[k] = _draw(rng, probs)
@@ -0,0 +1,101 @@
+"""
+Vectorized exact enumeration for heredity.
+
+Every gene assignment is a row of an integer array. The probability of
+each assignment together with the observed traits is computed with
+broadcasted NumPy table lookups, and marginals are accumulated with
+`bincount`, instead of calling `joint_probability` and `update` once per
+assignment. Unobserved traits are marginalized analytically rather than
+enumerated.
+"""
+
+import numpy as np
+
+from heredity import PROBS, empty_probabilities, inheritance_probability
+
+# Upper bound on the number of array elements materialized at once
+CHUNK_SIZE = 2 ** 22
+
+# GENE_TABLE[g] is the unconditional probability of g copies
+GENE_TABLE = np.array([PROBS["gene"][g] for g in range(3)])
+
+# TRAIT_TABLE[g, t] is the probability of trait t (1 or 0) given g copies
+TRAIT_TABLE = np.array([
+    [PROBS["trait"][g][False], PROBS["trait"][g][True]] for g in range(3)
+])
+
+# INHERIT_TABLE[g, m, f] is the probability of a child having g copies
+# given m copies in their mother and f copies in their father
+INHERIT_TABLE = np.array([
+    [[inheritance_probability(g, m, f) for f in range(3)] for m in range(3)]
+    for g in range(3)
+])
+
+
+def vectorized_probabilities(people):
+    """
+    Compute gene and trait distributions for everyone in `people` by
+    enumerating every gene assignment as arrays.
+    """
+    names = list(people)
+    index = {person: k for k, person in enumerate(names)}
+    observed = [k for k, person in enumerate(names)
+                if people[person]["trait"] is not None]
+    unobserved = [k for k, person in enumerate(names)
+                  if people[person]["trait"] is None]
+    evidence = np.array([int(people[names[k]]["trait"]) for k in observed],
+                        dtype=np.intp)
+    founders = [k for k, person in enumerate(names)
+                if people[person]["mother"] is None]
+    children = [k for k, person in enumerate(names)
+                if people[person]["mother"] is not None]
+    mothers = [index[people[names[k]]["mother"]] for k in children]
+    fathers = [index[people[names[k]]["father"]] for k in children]
+
+    gene_totals = np.zeros((len(names), 3))
+    trait_totals = np.zeros((len(unobserved), 2))
+    rows = max(1, CHUNK_SIZE // max(1, len(names)))
+    for genes in chunked_assignments(3, len(names), rows):
+
+        # Probability of each gene assignment and the observed traits
+        p = GENE_TABLE[genes[:, founders]].prod(axis=1)
+        p *= INHERIT_TABLE[
+            genes[:, children], genes[:, mothers], genes[:, fathers]
+        ].prod(axis=1)
+        p *= TRAIT_TABLE[genes[:, observed], evidence].prod(axis=1)
+
+        # Accumulate marginals, splitting each unobserved trait by the
+        # probability of the trait given the gene
+        for k in range(len(names)):
+            gene_totals[k] += np.bincount(genes[:, k], weights=p, minlength=3)
+        trait_totals += np.tensordot(
+            p, TRAIT_TABLE[genes[:, unobserved]], axes=1
+        )
+
+    # Normalize into the usual dictionary format
+    probabilities = empty_probabilities(people)
+    for k, person in enumerate(names):
+        for g in range(3):
+            probabilities[person]["gene"][g] = (
+                gene_totals[k, g] / gene_totals[k].sum()
+            )
+    for k in observed:
+        probabilities[names[k]]["trait"][people[names[k]]["trait"]] = 1
+    for u, k in enumerate(unobserved):
+        for t in (True, False):
+            probabilities[names[k]]["trait"][t] = (
+                trait_totals[u, int(t)] / trait_totals[u].sum()
+            )
+    return probabilities
+
+
+def chunked_assignments(base, width, rows):
+    """
+    Yield all `base ** width` assignments of values 0 to `base - 1` to
+    `width` variables, as the rows of arrays of at most `rows` rows.
+    """
+    total = base ** width
+    powers = base ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    for start in range(0, total, rows):
+        codes = np.arange(start, min(start + rows, total), dtype=np.int64)
+        yield (codes[:, None] // powers[None, :] % base).astype(np.intp)
@@ -0,0 +1,157 @@
+"""
+Policy evaluation for nim.
+
+In this game the player who takes the last object loses (misère nim),
+so the optimal strategy is known exactly: a position is won for the
+player to move if some pile has more than one object and the nim-sum
+(XOR) of the piles is nonzero, or if every pile has at most one object
+and the number of piles with one object is even. Policies are scored
+against that strategy, and by tournaments against optimal and random
+players played on a process pool.
+"""
+
+import itertools
+import json
+import random
+import sys
+from functools import reduce
+from multiprocessing import Pool
+
+from nim import Nim, NimAI, train_batched
+
+PLAYERS = ("optimal", "random")
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [3, 4, 5]:
+        sys.exit("Usage: python evaluate.py games every "
+                 "[tournament_games] [processes]")
+    n = int(sys.argv[1])
+    every = int(sys.argv[2])
+    games = int(sys.argv[3]) if len(sys.argv) >= 4 else 1000
+    processes = int(sys.argv[4]) if len(sys.argv) == 5 else None
+
+    # One JSON line per point of the training curve
+    for point in training_curve(n, every, games, processes):
+        print(json.dumps(point))
+        sys.stdout.flush()
+
+
+def winning(piles):
+    """
+    Return True if the player to move in `piles` wins with best play.
+    """
+    if all(pile <= 1 for pile in piles):
+        return sum(piles) % 2 == 0
+    return reduce(lambda a, b: a ^ b, piles) != 0
+
+
+def winning_actions(piles):
+    """
+    Return the actions in `piles` that leave the opponent in a lost
+    position.
+    """
+    actions = []
+    for i, j in sorted(Nim.available_actions(piles)):
+        after = list(piles)
+        after[i] -= j
+        if not winning(after):
+            actions.append((i, j))
+    return actions
+
+
+def optimal_action(piles, rng=random):
+    """
+    Return an optimal action in `piles`: a winning action if there is
+    one, or else a random available action.
+    """
+    actions = winning_actions(piles)
+    if actions:
+        return actions[0]
+    return rng.choice(sorted(Nim.available_actions(piles)))
+
+
+def score_policy(ai, initial=None):
+    """
+    Return the fraction of won positions reachable from piles `initial`
+    (by default, the AI's) in which `ai` chooses a winning action.
+    """
+    initial = ai.initial if initial is None else initial
+    won = 0
+    correct = 0
+    for piles in itertools.product(*(range(pile + 1) for pile in initial)):
+        if sum(piles) == 0 or not winning(piles):
+            continue
+        won += 1
+        if ai.choose_action(list(piles), epsilon=False) \
+                in winning_actions(piles):
+            correct += 1
+    return correct / won if won else 1
+
+
+def tournament(ai, opponent="optimal", games=1000, processes=None, seed=0):
+    """
+    Play `games` games of `ai`, choosing its best actions, against the
+    `opponent` player ("optimal" or "random") on `processes` worker
+    processes, with the AI moving first in half of the games. Return the
+    fraction of games the AI wins.
+    """
+    if opponent not in PLAYERS:
+        raise ValueError(f"Unknown opponent: {opponent}")
+    chunks = 4 * (processes or 1)
+    jobs = [
+        (ai, opponent, games // chunks + (1 if k < games % chunks else 0),
+         seed * chunks + k)
+        for k in range(chunks)
+    ]
+    with Pool(processes) as pool:
+        wins = sum(pool.map(_play_games, jobs))
+    return wins / games
+
+
+def _play_games(job):
+    ai, opponent, games, seed = job
+    rng = random.Random(seed)
+    wins = 0
+    for k in range(games):
+        game = Nim(ai.initial)
+        ai_player = k % 2
+        while game.winner is None:
+            if game.player == ai_player:
+                action = ai.choose_action(game.piles, epsilon=False)
+            elif opponent == "optimal":
+                action = optimal_action(game.piles, rng)
+            else:
+                action = rng.choice(sorted(Nim.available_actions(game.piles)))
+            game.move(action)
+        wins += game.winner == ai_player
+    return wins
+
+
+def training_curve(n, every, games=1000, processes=None, seed=0,
+                   player=None):
+    """
+    Train an AI for `n` games in steps of `every` games, and yield a
+    dictionary after each step with the number of games trained, the
+    policy score, and the win rates over `games`-game tournaments
+    against each player in `PLAYERS`.
+    """
+    player = player or NimAI()
+    step = 0
+    while player.games < n:
+        train_batched(
+            min(every, n - player.games), seed=seed + step, player=player
+        )
+        step += 1
+        point = {"games": player.games, "score": score_policy(player)}
+        for opponent in PLAYERS:
+            point[opponent] = tournament(
+                player, opponent, games, processes, seed + step
+            )
+        yield point
+
+
+if __name__ == "__main__":
+    main()
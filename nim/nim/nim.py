@@ -1,6 +1,15 @@
+import json
 import math
+import os
 import random
 import time
+from multiprocessing import Pool
+
+import numpy as np
+
+
+# Format of checkpoints written by `NimAI.save`
+CHECKPOINT_VERSION = 1
 
 
 class Nim():
@@ -70,22 +79,226 @@ class Nim():
             self.winner = self.player
 
 
+class QTable():
+
+    def __init__(self, initial=[1, 3, 5, 7], canonical=False):
+        """
+        Create a Q-table for games starting from piles `initial`, with
+        every Q-value 0.
+
+        Values are kept in a dense array with one row per state and one
+        column per action. A state `piles` is numbered by reading it as a
+        mixed-radix number whose ith digit is `piles[i]`, in base
+        `initial[i] + 1`. Action `(i, j)` is numbered by its position in
+        the list of every action `(i, j)` with 1 <= j <= initial[i].
+        Entries for actions not available in a state are -inf, so the
+        largest entry of a row is always an available action.
+
+        If `canonical` is True, the table only holds states whose piles
+        are in increasing order, for games starting from `sorted(initial)`,
+        and `rows` maps each state's number to its row (-1 for states not
+        in order). Callers sort piles before looking them up.
+        """
+        self.canonical = canonical
+        self.initial = sorted(initial) if canonical else list(initial)
+
+        # Place value of each pile in a state's number
+        self.strides = []
+        size = 1
+        for pile in reversed(self.initial):
+            self.strides.insert(0, size)
+            size *= pile + 1
+        self.num_states = size
+
+        # Every action, and the first column of each pile's actions
+        self.actions = [
+            (i, j)
+            for i, pile in enumerate(self.initial)
+            for j in range(1, pile + 1)
+        ]
+        self.offsets = []
+        offset = 0
+        for pile in self.initial:
+            self.offsets.append(offset)
+            offset += pile
+
+        # Piles of every state, to mark the actions available in each
+        piles = np.array([
+            [k // stride % (pile + 1)
+             for stride, pile in zip(self.strides, self.initial)]
+            for k in range(self.num_states)
+        ]).reshape(self.num_states, len(self.initial))
+        self.rows = None
+        if canonical:
+            ordered = (piles[:, :-1] <= piles[:, 1:]).all(axis=1)
+            self.rows = np.full(self.num_states, -1)
+            self.rows[ordered] = np.arange(ordered.sum())
+            piles = piles[ordered]
+            self.num_states = len(piles)
+        pile_of = np.array([i for i, _ in self.actions], dtype=int)
+        count_of = np.array([j for _, j in self.actions], dtype=int)
+        self.valid = piles[:, pile_of] >= count_of
+        self.values = np.where(self.valid, 0.0, -np.inf)
+
+        # Number of times each entry has been set
+        self.visits = np.zeros(self.valid.shape, dtype=np.int64)
+
+        # Total absolute change made by updates, and number of updates
+        self.change = 0.0
+        self.changes = 0
+
+    def state_index(self, state):
+        """
+        Return the row of state `state`.
+
+        Raises ValueError if `state` is not a state of this table: a pile
+        is out of range, or the table is canonical and the piles are not
+        in increasing order.
+        """
+        if len(state) != len(self.initial) or not all(
+            0 <= p <= pile for p, pile in zip(state, self.initial)
+        ):
+            raise ValueError(f"State {state} out of range for {self.initial}")
+        k = sum(p * stride for p, stride in zip(state, self.strides))
+        if self.rows is not None:
+            row = int(self.rows[k])
+            if row < 0:
+                raise ValueError(f"State {state} is not in canonical order")
+            return row
+        return k
+
+    def action_index(self, action):
+        """Return the column of action `(i, j)`."""
+        return self.offsets[action[0]] + action[1] - 1
+
+    def __getitem__(self, key):
+        state, action = key
+        return float(
+            self.values[self.state_index(state), self.action_index(action)]
+        )
+
+    def __setitem__(self, key, value):
+        state, action = key
+        row = self.state_index(state)
+        column = self.action_index(action)
+        self.change += abs(value - self.values[row, column])
+        self.changes += 1
+        self.values[row, column] = value
+        self.visits[row, column] += 1
+
+    def merge(self, tables):
+        """
+        Replace the Q-values of this table by the average of the Q-values
+        of `tables`, weighted by how often each table set each entry.
+        Entries no table set keep their values. Visits become the total
+        over `tables`.
+        """
+        visits = sum(table.visits for table in tables)
+        weighted = sum(
+            table.visits * np.where(table.visits > 0, table.values, 0)
+            for table in tables
+        )
+        seen = visits > 0
+        merged = weighted[seen] / visits[seen]
+        self.change += float(np.abs(merged - self.values[seen]).sum())
+        self.changes += int(seen.sum())
+        self.values[seen] = merged
+        self.visits = visits
+
+    def best_value(self, state):
+        """
+        Return the largest Q-value of the actions available in `state`,
+        or 0 if there are none.
+        """
+        row = self.state_index(state)
+        if not self.valid[row].any():
+            return 0
+        return float(self.values[row].max())
+
+    def best_action(self, state):
+        """
+        Return the available action with the largest Q-value in `state`,
+        the first in the order of `actions` in case of a tie, or None if
+        there are no available actions.
+        """
+        row = self.state_index(state)
+        if not self.valid[row].any():
+            return None
+        return self.actions[int(self.values[row].argmax())]
+
+
 class NimAI():
 
-    def __init__(self, alpha=0.5, epsilon=0.1):
+    def __init__(self, alpha=0.5, epsilon=0.1, initial=[1, 3, 5, 7],
+                 canonical=False):
         """
-        Initialize AI with an empty Q-learning dictionary,
-        an alpha (learning) rate, and an epsilon rate.
+        Initialize AI with an empty Q-table for games starting from piles
+        `initial`, an alpha (learning) rate, and an epsilon rate.
 
-        The Q-learning dictionary maps `(state, action)`
-        pairs to a Q-value (a number).
+        The Q-table maps `(state, action)` pairs to a Q-value (a number).
          - `state` is a tuple of remaining piles, e.g. (1, 1, 4, 4)
          - `action` is a tuple `(i, j)` for an action
+
+        If `canonical` is True, states that differ only in the order of
+        their piles share Q-values: states are sorted before lookup, and
+        actions are mapped between the sorted and the original piles.
         """
-        self.q = dict()
+        self.initial = list(initial)
+        self.canonical = canonical
+        self.q = QTable(initial, canonical)
         self.alpha = alpha
         self.epsilon = epsilon
 
+        # Number of training games played so far
+        self.games = 0
+
+    def save(self, filename):
+        """
+        Save the AI to `filename` as a NumPy .npz file holding the Q-table,
+        its visit counts, and the piles, alpha, epsilon and number of
+        games played.
+        """
+        metadata = {
+            "version": CHECKPOINT_VERSION,
+            "initial": self.initial,
+            "canonical": self.canonical,
+            "alpha": self.alpha,
+            "epsilon": self.epsilon,
+            "games": self.games
+        }
+
+        # Write to a temporary file first, so that an interrupted save
+        # never leaves a broken checkpoint behind
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{filename}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(
+                f, values=self.q.values, visits=self.q.visits,
+                metadata=np.array(json.dumps(metadata))
+            )
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the AI saved in `filename` by `save`.
+        """
+        with np.load(filename) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("version") != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint: {filename}")
+            ai = cls(
+                metadata["alpha"], metadata["epsilon"], metadata["initial"],
+                metadata.get("canonical", False)
+            )
+            if data["values"].shape != ai.q.values.shape:
+                raise ValueError(f"Corrupt checkpoint: {filename}")
+            ai.q.values[:] = data["values"]
+            ai.q.visits[:] = data["visits"]
+        ai.games = metadata["games"]
+        return ai
+
     def update(self, old_state, action, new_state, reward):
         """
         Update Q-learning model, given an old state, an action taken
@@ -96,15 +309,27 @@ class NimAI():
         best_future = self.best_future_reward(new_state)
         self.update_q_value(old_state, action, old, reward, best_future)
 
+    def canonicalize(self, state, action=None):
+        """
+        Return `(state, action, order)`, where `state` and `action` are as
+        looked up in the Q-table (sorted, for a canonical AI), and
+        `order[k]` is the original index of the kth pile looked up.
+        """
+        if not self.canonical:
+            return state, action, range(len(state))
+        order = sorted(range(len(state)), key=lambda i: state[i])
+        state = [state[i] for i in order]
+        if action is not None:
+            action = (order.index(action[0]), action[1])
+        return state, action, order
+
     def get_q_value(self, state, action):
         """
         Return the Q-value for the state `state` and the action `action`.
-        If no Q-value exists yet in `self.q`, return 0.
+        Pairs that have not been updated yet have Q-value 0.
         """
-        try:
-            return self.q[tuple(state),action]
-        except:
-            return 0
+        state, action, _ = self.canonicalize(state, action)
+        return self.q[state, action]
 
     def update_q_value(self, state, action, old_q, reward, future_rewards):
         """
@@ -121,7 +346,10 @@ class NimAI():
         `alpha` is the learning rate, and `new value estimate`
         is the sum of the current reward and estimated future rewards.
         """
-        self.q[tuple(state),action] += self.alpha*(reward+future_rewards-old_q)
+        state, action, _ = self.canonicalize(state, action)
+        self.q[state, action] = (
+            old_q + self.alpha * (reward + future_rewards - old_q)
+        )
 
     def best_future_reward(self, state):
         """
@@ -129,124 +357,371 @@ class NimAI():
         pairs available in that state and return the maximum of all
         of their Q-values.
 
-        Use 0 as the Q-value if a `(state, action)` pair has no
-        Q-value in `self.q`. If there are no available actions in
-        `state`, return 0.
+        If there are no available actions in `state`, return 0.
         """
-        if sum(state)==0:
-            return 0
-        best = -99999
-        for i in range(len(state)):
-            for j in range(state[i]):
-                try:
-                    curr = self.q[tuple(state),(i,j+1)]
-                except:
-                    curr = 0
-                    self.q[tuple(state),(i,j+1)] = 0
-                if curr>best:
-                    best = curr
-        return best
+        state, _, _ = self.canonicalize(state)
+        return self.q.best_value(state)
 
     def choose_action(self, state, epsilon=True):
         """
         Given a state `state`, return an action `(i, j)` to take.
 
         If `epsilon` is `False`, then return the best action
-        available in the state (the one with the highest Q-value,
-        using 0 for pairs that have no Q-values).
+        available in the state (the one with the highest Q-value).
 
         If `epsilon` is `True`, then with probability
         `self.epsilon` choose a random available action,
         otherwise choose the best action available.
 
-        If multiple actions have the same Q-value, any of those
-        options is an acceptable return value.
-        """
-        best = -99999
-        act = ()
-        actions = []
-        for i in range(len(state)):
-            for j in range(state[i]):
-                actions.append((i,j+1))
-                try:
-                    curr = self.q[tuple(state),(i, j + 1)]
-                except:
-                    curr = 0
-                    self.q[tuple(state),(i, j + 1)] = 0
-                if curr > best:
-                    best = curr
-                    act = (i,j+1)
-        a = None
-        if not epsilon:
-            return act
-        else:
-            actions.remove(act)
-            while a is None:
-                a = random.choices([actions,[act]],[self.epsilon,1-self.epsilon],k=1)
-            if len(actions)==0:
-                return act
-            return random.choice(a)[0]
+        If multiple actions have the same Q-value, the first in the
+        order of the Q-table's actions is returned.
+        """
+        if epsilon and random.random() < self.epsilon:
+            return random.choice([
+                (i, j + 1)
+                for i in range(len(state))
+                for j in range(state[i])
+            ])
+        state, _, order = self.canonicalize(state)
+        action = self.q.best_action(state)
+        if action is None:
+            return None
+        return (order[action[0]], action[1])
+
+
+class Telemetry():
+
+    def __init__(self, interval=1000, callback=None, filename=None):
+        """
+        Report training progress every `interval` games.
+
+        Each report is a dictionary with the number of `games` played,
+        `games_per_second` and `mean_abs_update` (the mean absolute change
+        of a Q-value per update) since the last report, the number of
+        `q_entries` updated so far, `epsilon` and the `elapsed` seconds.
+        Reports are passed to `callback` and appended as JSON lines to
+        `filename`, or printed if neither is given.
+        """
+        self.interval = interval
+        self.callback = callback
+        self.filename = filename
 
+    def start(self, player):
+        """
+        Start timing training of `player`.
+        """
+        self.started = time.perf_counter()
+        self.last = (self.started, player.games,
+                     player.q.change, player.q.changes)
+        self.next = (player.games // self.interval + 1) * self.interval
+
+    def record(self, player):
+        """
+        Report on `player` if it has played enough games since the last
+        report. Cheap enough to call after every game.
+        """
+        if player.games < self.next:
+            return
+        now = time.perf_counter()
+        then, games, change, changes = self.last
+        q = player.q
+        report = {
+            "games": player.games,
+            "games_per_second": (player.games - games) / (now - then),
+            "q_entries": int((q.visits > 0).sum()),
+            "mean_abs_update": (
+                (q.change - change) / (q.changes - changes)
+                if q.changes > changes else 0.0
+            ),
+            "epsilon": player.epsilon,
+            "elapsed": now - self.started
+        }
+        self.last = (now, player.games, q.change, q.changes)
+        self.next = (player.games // self.interval + 1) * self.interval
+        self.emit(report)
 
-def train(n):
+    def emit(self, report):
+        """
+        Send `report` to the callback, the file, or stdout.
+        """
+        if self.callback is not None:
+            self.callback(report)
+        if self.filename is not None:
+            with open(self.filename, "a") as f:
+                f.write(json.dumps(report) + "\n")
+        if self.callback is None and self.filename is None:
+            print(f"Trained {report['games']} games "
+                  f"({report['games_per_second']:.0f} games/s, "
+                  f"{report['q_entries']} Q-values, "
+                  f"mean update {report['mean_abs_update']:.4f})")
+
+
+def train(n, checkpoint=None, every=1000, telemetry=None):
     """
     Train an AI by playing `n` games against itself.
+
+    If `checkpoint` is given, the AI is saved there every `every` games
+    and at the end, and if the file already exists, training resumes
+    from it until the AI has played `n` games in total. Progress is
+    reported to `telemetry`, if given.
     """
 
-    player = NimAI()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        player = NimAI.load(checkpoint)
+    else:
+        player = NimAI()
+    started = player.games
+    if telemetry is not None:
+        telemetry.start(player)
 
     # Play n games
-    for i in range(n):
-        print(f"Playing training game {i + 1}")
-        game = Nim()
-
-        # Keep track of last move made by either player
-        last = {
-            0: {"state": None, "action": None},
-            1: {"state": None, "action": None}
-        }
+    while player.games < n:
+        play_training_game(player)
+        player.games += 1
+        if checkpoint is not None and player.games % every == 0:
+            player.save(checkpoint)
+        if telemetry is not None:
+            telemetry.record(player)
 
-        # Game loop
-        while True:
-
-            # Keep track of current state and action
-            state = game.piles.copy()
-            action = player.choose_action(game.piles)
-
-            # Keep track of last state and action
-            last[game.player]["state"] = state
-            last[game.player]["action"] = action
-
-            # Make move
-            game.move(action)
-            new_state = game.piles.copy()
-
-            # When game is over, update Q values with rewards
-            if game.winner is not None:
-                player.update(state, action, new_state, -1)
-                player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
-                    new_state,
-                    1
-                )
-                break
-
-            # If game is continuing, no rewards yet
-            elif last[game.player]["state"] is not None:
-                player.update(
-                    last[game.player]["state"],
-                    last[game.player]["action"],
-                    new_state,
-                    0
-                )
-
-    print("Done training")
+    if checkpoint is not None and player.games != started:
+        player.save(checkpoint)
 
     # Return the trained AI
     return player
 
 
+def play_training_game(player):
+    """
+    Play one game of `player` against itself from the piles its Q-table
+    was made for, updating Q-values as the game goes.
+    """
+    game = Nim(player.initial)
+
+    # Keep track of last move made by either player
+    last = {
+        0: {"state": None, "action": None},
+        1: {"state": None, "action": None}
+    }
+
+    # Game loop
+    while True:
+
+        # Keep track of current state and action
+        state = game.piles.copy()
+        action = player.choose_action(game.piles)
+
+        # Keep track of last state and action
+        last[game.player]["state"] = state
+        last[game.player]["action"] = action
+
+        # Make move
+        game.move(action)
+        new_state = game.piles.copy()
+
+        # When game is over, update Q values with rewards
+        if game.winner is not None:
+            player.update(state, action, new_state, -1)
+            player.update(
+                last[game.player]["state"],
+                last[game.player]["action"],
+                new_state,
+                1
+            )
+            break
+
+        # If game is continuing, no rewards yet
+        elif last[game.player]["state"] is not None:
+            player.update(
+                last[game.player]["state"],
+                last[game.player]["action"],
+                new_state,
+                0
+            )
+
+
+def train_parallel(n, processes=None, sync=1000, seed=None, alpha=0.5,
+                   epsilon=0.1, initial=[1, 3, 5, 7], canonical=False,
+                   telemetry=None):
+    """
+    Train an AI by playing `n` games against itself on `processes` worker
+    processes (by default, one per CPU).
+
+    Training runs in rounds. In each round every worker starts from a
+    copy of the shared Q-table and plays up to `sync` games with its own
+    random seed, and the workers' tables are then merged by averaging
+    each Q-value weighted by how often each worker updated it. Given a
+    `seed`, the worker seeds are drawn from it, so the result depends
+    only on `n`, `processes`, `sync` and `seed`. Progress is reported to
+    `telemetry` after every round, if given.
+    """
+    processes = processes or os.cpu_count()
+    player = NimAI(alpha, epsilon, initial, canonical)
+    master = random.Random(seed)
+    if telemetry is not None:
+        telemetry.start(player)
+    remaining = n
+    with Pool(processes) as pool:
+        while remaining > 0:
+
+            # Share this round's games out as evenly as possible
+            games = min(remaining, sync * processes)
+            shares = [
+                games // processes + (1 if k < games % processes else 0)
+                for k in range(processes)
+            ]
+            jobs = [
+                (player.q.values, alpha, epsilon, initial, canonical, share,
+                 master.getrandbits(64))
+                for share in shares if share > 0
+            ]
+            tables = pool.map(_train_shard, jobs)
+            visits = player.q.visits
+            player.q.merge(tables)
+            player.q.visits += visits
+            player.games += games
+            remaining -= games
+            if telemetry is not None:
+                telemetry.record(player)
+    return player
+
+
+def train_batched(n, batch=4096, seed=None, player=None, telemetry=None):
+    """
+    Train an AI by playing `n` games against itself, `batch` games at a
+    time in lockstep, and return it. Training continues from `player` if
+    given, or else starts from a new `NimAI`.
+
+    Every game in the batch makes one move per step: piles, the player
+    to move and each player's last state and action are arrays with one
+    row per game, and moves, rewards and Q-updates are computed for all
+    games at once. The updates of a step are all computed from the
+    Q-values before the step, and several updates to the same entry in
+    one step are averaged. Progress is reported to `telemetry` after
+    every step, if given.
+    """
+    player = player or NimAI()
+    q = player.q
+    rng = np.random.default_rng(seed)
+    strides = np.array(q.strides)
+    pile_of = np.array([i for i, _ in q.actions])
+    count_of = np.array([j for _, j in q.actions])
+    initial = np.array(player.initial)
+
+    size = min(batch, n)
+    games = np.arange(size)
+    piles = np.tile(initial, (size, 1))
+    turn = np.zeros(size, dtype=int)
+
+    # Row and column of each player's last move, -1 before their first
+    last_row = np.full((size, 2), -1)
+    last_column = np.full((size, 2), -1)
+    started = size
+
+    def lookup(piles):
+        """Return the Q-table rows of `piles`, and the pile order used."""
+        if not player.canonical:
+            return piles @ strides, None
+        order = piles.argsort(axis=1, kind="stable")
+        rows = np.take_along_axis(piles, order, axis=1) @ strides
+        return q.rows[rows], order
+
+    if telemetry is not None:
+        telemetry.start(player)
+    while len(games) > 0:
+        rows, order = lookup(piles[games])
+
+        # Epsilon-greedy: random scores over the available actions for
+        # exploring games, Q-values for the rest
+        scores = q.values[rows]
+        explore = rng.random(len(games)) < player.epsilon
+        if explore.any():
+            noise = rng.random((explore.sum(), len(q.actions)))
+            scores[explore] = np.where(q.valid[rows[explore]], noise, -1)
+        columns = scores.argmax(axis=1)
+
+        # Make the moves, mapping sorted piles back to the original ones
+        moved = pile_of[columns]
+        if order is not None:
+            moved = order[np.arange(len(games)), moved]
+        piles[games, moved] -= count_of[columns]
+        new_rows, _ = lookup(piles[games])
+        done = (piles[games] == 0).all(axis=1)
+        mover = turn[games]
+        other = 1 - mover
+        previous_row = last_row[games, other]
+        previous_column = last_column[games, other]
+        waiting = previous_row >= 0
+
+        # The loser's last move is rewarded -1 and the winner's last
+        # move 1; otherwise the opponent's last move learns the value
+        # of the new state
+        best = np.where(
+            q.valid[new_rows].any(axis=1), q.values[new_rows].max(axis=1), 0
+        )
+        update_rows = [rows[done], previous_row[waiting]]
+        update_columns = [columns[done], previous_column[waiting]]
+        targets = [
+            np.full(done.sum(), -1.0),
+            np.where(done[waiting], 1.0, best[waiting])
+        ]
+        _apply_updates(
+            q, player.alpha, np.concatenate(update_rows),
+            np.concatenate(update_columns), np.concatenate(targets)
+        )
+
+        last_row[games, mover] = rows
+        last_column[games, mover] = columns
+        turn[games] = other
+
+        # Finished games start over until n games have been started
+        finished = games[done]
+        player.games += len(finished)
+        if telemetry is not None:
+            telemetry.record(player)
+        restart = finished[:max(0, n - started)]
+        started += len(restart)
+        piles[restart] = initial
+        turn[restart] = 0
+        last_row[restart] = -1
+        last_column[restart] = -1
+        stopped = finished[len(restart):]
+        if len(stopped):
+            games = np.setdiff1d(games, stopped)
+    return player
+
+
+def _apply_updates(q, alpha, rows, columns, targets):
+    """
+    Move each entry `(rows[k], columns[k])` of Q-table `q` toward
+    `targets[k]` at rate `alpha`, averaging the targets of repeated
+    entries.
+    """
+    if len(rows) == 0:
+        return
+    keys = rows * q.values.shape[1] + columns
+    keys, inverse, counts = np.unique(
+        keys, return_inverse=True, return_counts=True
+    )
+    means = np.bincount(inverse, weights=targets) / counts
+    rows, columns = np.divmod(keys, q.values.shape[1])
+    old = q.values[rows, columns]
+    change = alpha * (means - old)
+    q.values[rows, columns] = old + change
+    q.visits[rows, columns] += counts
+    q.change += float(np.abs(change).sum())
+    q.changes += len(rows)
+
+
+def _train_shard(job):
+    values, alpha, epsilon, initial, canonical, games, seed = job
+    random.seed(seed)
+    player = NimAI(alpha, epsilon, initial, canonical)
+    player.q.values[:] = values
+    for _ in range(games):
+        play_training_game(player)
+    return player.q
+
+
 def play(ai, human_player=None):
     """
     Play human game against the AI.
@@ -258,8 +733,8 @@ def play(ai, human_player=None):
     if human_player is None:
         human_player = random.randint(0, 1)
 
-    # Create new game
-    game = Nim()
+    # Create new game with the piles the AI was trained on
+    game = Nim(ai.initial)
 
     # Game loop
     while True:
@@ -1,4 +1,14 @@
-from nim import train, play
+import os
 
-ai = train(10000)
+from nim import Telemetry, train, play
+
+# Where the trained AI is kept between launches
+CHECKPOINT = os.environ.get("NIM_CHECKPOINT") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME")
+    or os.path.join(os.path.expanduser("~"), ".cache"),
+    "nim", "ai.npz"
+)
+
+# Resumes a partly trained checkpoint, and returns at once from a full one
+ai = train(10000, checkpoint=CHECKPOINT, telemetry=Telemetry(2500))
 play(ai)
@@ -0,0 +1,163 @@
+"""
+Headless Tic Tac Toe benchmark.
+
+Plays games through the `tictactoe` API, either minimax against itself
+("self") or minimax against a random player ("random"), and reports search
+throughput, per-move latency and transposition cache statistics.
+
+Every run is reported twice: "cold", searching exactly as the game does
+with no cache, and "cached", memoizing positions in a cache emptied at
+the start of every game. Neither depends on how games are split across
+processes.
+"""
+
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+import tictactoe as ttt
+
+MODES = ("self", "random")
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3, 4]:
+        sys.exit("Usage: python benchmark.py games [self|random] [processes]")
+    games = int(sys.argv[1])
+    mode = sys.argv[2] if len(sys.argv) >= 3 else "self"
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else 1
+    if mode not in MODES:
+        sys.exit(f"Unknown mode: {mode}")
+
+    for caching in [False, True]:
+        report = benchmark(games, mode, processes, caching=caching)
+        print_report(report)
+
+
+def benchmark(games, mode="self", processes=1, seed=0, caching=False):
+    """
+    Play `games` games in `mode` spread over `processes` worker processes
+    and return a report dictionary of the combined results. If `caching`
+    is true, minimax memoizes positions within each game.
+
+    Raises AssertionError if minimax ever loses, or if self-play ever
+    ends in anything other than a draw.
+    """
+    start = time.perf_counter()
+    chunks = [
+        (range(k, games, processes), mode, seed, caching)
+        for k in range(processes)
+    ]
+    if processes == 1:
+        results = [play_games(*chunks[0])]
+    else:
+        with Pool(processes) as pool:
+            results = pool.starmap(play_games, chunks)
+    wall = time.perf_counter() - start
+
+    # Combine worker results
+    report = {
+        "games": games,
+        "mode": mode,
+        "processes": processes,
+        "caching": caching,
+        "wall": wall,
+        "search": 0,
+        "nodes": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "latencies": [],
+        "outcomes": {ttt.X: 0, ttt.O: 0, None: 0}
+    }
+    for res in results:
+        for field in ["search", "nodes", "cache_hits", "cache_misses"]:
+            report[field] += res[field]
+        report["latencies"].extend(res["latencies"])
+        for outcome, count in res["outcomes"].items():
+            report["outcomes"][outcome] += count
+    report["latencies"].sort()
+    return report
+
+
+def play_games(indices, mode, seed, caching=False):
+    """
+    Play the games numbered by `indices`, each starting from an empty
+    cache, and return the counters and timings collected while doing so.
+
+    In "random" mode minimax plays X in even-numbered games and O in
+    odd-numbered games, against a player seeded by the game number.
+    """
+    ttt.caching = caching
+    ttt.reset_stats()
+    latencies = []
+    outcomes = {ttt.X: 0, ttt.O: 0, None: 0}
+    for index in indices:
+        rng = random.Random(seed + index)
+        engine = ttt.X if index % 2 == 0 else ttt.O
+        board = ttt.initial_state()
+        ttt.cache.clear()
+        while not ttt.terminal(board):
+            if mode == "random" and ttt.player(board) != engine:
+                move = rng.choice(sorted(ttt.actions(board)))
+            else:
+                tic = time.perf_counter()
+                move = ttt.minimax(board)
+                latencies.append(time.perf_counter() - tic)
+            board = ttt.result(board, move)
+
+        # Perfect play never loses, and never wins against itself
+        winner = ttt.winner(board)
+        if mode == "self":
+            assert winner is None, f"self-play game {index} won by {winner}"
+        else:
+            assert winner in [None, engine], f"minimax lost game {index}"
+        outcomes[winner] += 1
+
+    return {
+        "search": sum(latencies),
+        "nodes": ttt.stats["nodes"],
+        "cache_hits": ttt.stats["cache_hits"],
+        "cache_misses": ttt.stats["cache_misses"],
+        "latencies": latencies,
+        "outcomes": outcomes
+    }
+
+
+def percentile(values, fraction):
+    """
+    Return the value at `fraction` of the way through sorted `values`.
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def print_report(report):
+    """
+    Print a report returned by `benchmark`.
+    """
+    lookups = report["cache_hits"] + report["cache_misses"]
+    latencies = report["latencies"]
+    print(f"Games: {report['games']} ({report['mode']}, "
+          f"{report['processes']} processes, "
+          f"{'cached' if report['caching'] else 'cold'})")
+    print(f"  X wins: {report['outcomes'][ttt.X]}")
+    print(f"  O wins: {report['outcomes'][ttt.O]}")
+    print(f"  Draws: {report['outcomes'][None]}")
+    print(f"Wall time: {report['wall']:.3f}s")
+    print(f"Nodes visited: {report['nodes']}")
+    if report["search"]:
+        print(f"Nodes per second: {report['nodes'] / report['search']:.0f}")
+    if lookups:
+        print(f"Cache hit rate: {report['cache_hits'] / lookups:.4f}")
+    print(f"Move latency ({len(latencies)} moves):")
+    for name, fraction in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]:
+        print(f"  {name}: {percentile(latencies, fraction) * 1000:.3f}ms")
+    print(f"  max: {percentile(latencies, 1) * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
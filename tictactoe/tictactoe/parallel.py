@@ -0,0 +1,233 @@
+"""
+Root-parallel Tic Tac Toe search.
+
+Each legal move at the root is searched by a separate worker process with
+alpha-beta pruning. Workers share the best score found so far for the root
+player through shared memory, so a good move found by one worker narrows
+the search window of all the others.
+"""
+
+import sys
+import time
+from multiprocessing import Lock, Pool, RawValue
+
+import tictactoe as ttt
+
+# Shared state of a worker process, set up by `_init_worker`
+_shared = {"best": None, "lock": None, "sign": 1, "seen": -2}
+
+# Maps board positions to (lower, upper) bounds on their minimax value.
+# Bounds stay valid between searches, so each worker keeps its table.
+_table = {}
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python parallel.py (size|check) [processes]")
+    processes = int(sys.argv[2]) if len(sys.argv) == 3 else None
+    if sys.argv[1] == "check":
+        with ParallelSearch(processes) as search:
+            wrong = check_positions(search)
+        for board, move in wrong:
+            print(f"Suboptimal move {move} in {board}")
+        print(f"{len(wrong)} suboptimal moves")
+        sys.exit(1 if wrong else 0)
+    size = int(sys.argv[1])
+
+    board = ttt.initial_state(size)
+    with ParallelSearch(processes) as search:
+        while not ttt.terminal(board):
+            start = time.perf_counter()
+            move = search.minimax(board)
+            elapsed = time.perf_counter() - start
+            print(f"{ttt.player(board)} plays {move} ({elapsed:.3f}s)")
+            board = ttt.result(board, move)
+    winner = ttt.winner(board)
+    print(f"Winner: {winner}" if winner else "Tie")
+
+
+class ParallelSearch():
+
+    def __init__(self, processes=None):
+        """
+        Start a pool of `processes` workers (default: one per CPU)
+        sharing a single root bound.
+        """
+        self.best = RawValue("i", 0)
+        self.lock = Lock()
+        self.pool = Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(self.best, self.lock)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the worker pool.
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+    def minimax(self, board):
+        """
+        Returns the optimal action for the current player on the board,
+        searching every root move in parallel.
+        """
+        if ttt.terminal(board):
+            return None
+        sign = 1 if ttt.player(board) == ttt.X else -1
+
+        # Scores are kept from the root player's point of view
+        self.best.value = -2
+        results = self.pool.starmap(
+            _search_root_move,
+            [(board, action, sign) for action in sorted(ttt.actions(board))]
+        )
+
+        # Only exact scores can be compared; a move cut off by the shared
+        # bound is never better than the move that set the bound
+        best_action = None
+        best_score = -2
+        for action, score, exact in results:
+            if exact and score > best_score:
+                best_action, best_score = action, score
+        return best_action
+
+
+def parallel_minimax(board, processes=None):
+    """
+    Returns the optimal action for the current player on the board,
+    using a one-off pool of `processes` workers.
+    """
+    with ParallelSearch(processes) as search:
+        return search.minimax(board)
+
+
+def check_positions(search, sweeps=1):
+    """
+    Ask `search` for a move in every reachable non-terminal 3x3 position,
+    `sweeps` times over, and return a list of `(board, move)` for every
+    move whose value is worse than the position's minimax value.
+    """
+    ttt.caching = True
+    positions = []
+    seen = set()
+
+    def visit(board):
+        key = tuple(tuple(row) for row in board)
+        if key in seen or ttt.terminal(board):
+            return
+        seen.add(key)
+        positions.append(board)
+        for action in ttt.actions(board):
+            visit(ttt.result(board, action))
+
+    visit(ttt.initial_state())
+    wrong = []
+    for _ in range(sweeps):
+        for board in positions:
+            move = search.minimax(board)
+            if ttt.optimal(ttt.result(board, move)) != ttt.optimal(board):
+                wrong.append((board, move))
+    return wrong
+
+
+def _init_worker(best, lock):
+    _shared["best"] = best
+    _shared["lock"] = lock
+
+
+def _search_root_move(board, action, sign):
+    """
+    Search one root move and return `(action, score, exact)`, where `score`
+    is from the root player's point of view and `exact` is False if the
+    score is only an upper bound because the shared bound cut the search.
+    """
+    _shared["sign"] = sign
+    _shared["seen"] = -2
+    score = sign * alphabeta(ttt.result(board, action), -1, 1)
+    exact = score > _shared["seen"]
+    if exact:
+        with _shared["lock"]:
+            if score > _shared["best"].value:
+                _shared["best"].value = score
+    return action, score, exact
+
+
+def alphabeta(board, alpha, beta):
+    """
+    Returns the minimax value of the board from X's point of view if it
+    lies strictly between `alpha` and `beta`, otherwise a bound on it.
+
+    The root player's shared best score is folded into the window at
+    every node where it leaves the window open. If another worker raises
+    it while this node is being searched, children will have been
+    searched with narrower windows than this node's, so what this node
+    returns is not recorded in the table.
+    """
+    best = _shared["best"].value
+    if best > _shared["seen"]:
+        _shared["seen"] = best
+
+    # A bound that would close the window means nothing under this node
+    # can change the root's choice; such a node is searched with its own
+    # window, since bounds returned from an empty window prove nothing
+    if _shared["sign"] == 1 and best < beta:
+        alpha = max(alpha, best)
+    elif _shared["sign"] == -1 and -best > alpha:
+        beta = min(beta, -best)
+    seen = _shared["seen"]
+
+    key = tuple(tuple(row) for row in board)
+    lower, upper = _table.get(key, (-1, 1))
+    if lower >= beta or lower == upper:
+        return lower
+    if upper <= alpha:
+        return upper
+    alpha = max(alpha, lower)
+    beta = min(beta, upper)
+
+    if ttt.terminal(board):
+        value = ttt.utility(board)
+        _table[key] = (value, value)
+        return value
+
+    window = (alpha, beta)
+    if ttt.player(board) == ttt.X:
+        value = -1
+        for action in ttt.actions(board):
+            value = max(value, alphabeta(ttt.result(board, action), alpha, beta))
+            alpha = max(alpha, value)
+            if value >= beta:
+                break
+    else:
+        value = 1
+        for action in ttt.actions(board):
+            value = min(value, alphabeta(ttt.result(board, action), alpha, beta))
+            beta = min(beta, value)
+            if value <= alpha:
+                break
+
+    # Record what the search proved about this position, unless the
+    # shared bound moved under it
+    if _shared["seen"] != seen:
+        return value
+    if value <= window[0]:
+        _table[key] = (lower, value)
+    elif value >= window[1]:
+        _table[key] = (value, upper)
+    else:
+        _table[key] = (value, value)
+    return value
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,24 @@ X = "X"
 O = "O"
 EMPTY = None
 
+# Search counters, read and reset by benchmark.py
+stats = {"nodes": 0, "cache_hits": 0, "cache_misses": 0}
 
-def initial_state():
+# Whether optimal() memoizes values in `cache`. Off by default, so the
+# game searches exactly as it always has; the cache is never bounded
+caching = False
+
+# Maps board positions (as tuples of rows) to their minimax value
+cache = {}
+
+
+def initial_state(size=3):
     """
     Returns starting state of the board.
+    Boards larger than the default 3x3 are won by completing a full
+    row, column or diagonal.
     """
-    return [[EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY],
-            [EMPTY, EMPTY, EMPTY]]
+    return [[EMPTY] * size for _ in range(size)]
 
 
 def player(board):
@@ -62,9 +72,9 @@ def result(board, action):
     return bard
 
 def check(list):
-    if list.count(X)==3:
+    if list.count(X)==len(list):
         return X
-    elif list.count(O)==3:
+    elif list.count(O)==len(list):
         return O
     else:
         return None
@@ -73,17 +83,18 @@ def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
+    size = len(board)
     num = 0
     leftdiag = []
     rightdiag = []
-    verts = [[],[],[]]
+    verts = [[] for _ in range(size)]
     for row in board:
         out = check(row)
         if out!=None:
             return out
         leftdiag.append(board[num][num])
-        rightdiag.append(board[num][2-num])
-        for i in range(3):
+        rightdiag.append(board[num][size-1-num])
+        for i in range(size):
             verts[i].append(row[i])
         num+=1
     verts.append(leftdiag)
@@ -119,26 +130,45 @@ def utility(board):
     return 0
 
 def optimal(board):
+    """
+    Returns the minimax value of the board: 1 if X can force a win,
+    -1 if O can, 0 otherwise. Values are memoized in `cache` when
+    `caching` is set.
+    """
+    stats["nodes"] += 1
+    if caching:
+        key = tuple(tuple(row) for row in board)
+        if key in cache:
+            stats["cache_hits"] += 1
+            return cache[key]
+        stats["cache_misses"] += 1
     if terminal(board):
-        return utility(board)
-    turn = player(board)
-    action = actions(board)
-    if turn=="X":
-        a = []
-        for act in action:
-            val = optimal(result(board,act))
-            if val==1:
-                return val
-            a.append(val)
-        return max(a)
-    if turn=="O":
-        b = []
-        for act in action:
-            val = optimal(result(board,act))
-            if val==-1:
-                return val
-            b.append(val)
-        return min(b)
+        value = utility(board)
+    elif player(board) == X:
+        value = -1
+        for act in actions(board):
+            value = max(value, optimal(result(board, act)))
+            if value == 1:
+                break
+    else:
+        value = 1
+        for act in actions(board):
+            value = min(value, optimal(result(board, act)))
+            if value == -1:
+                break
+    if caching:
+        cache[key] = value
+    return value
+
+
+def reset_stats():
+    """
+    Zero the search counters and empty the transposition cache.
+    """
+    for counter in stats:
+        stats[counter] = 0
+    cache.clear()
+
 
 def minimax(board):
     """
@@ -148,7 +178,7 @@ def minimax(board):
         return None
     play = player(board)
     action = actions(board)
-    op = ()
+    op = next(iter(action))
     l ={}
     for act in action:
         val=optimal(result(board,act))